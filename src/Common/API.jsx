@@ -6,6 +6,9 @@ import { backend_URL } from "../components/HomePage";
 
 const APIService = async ({ question, onResponse, retries = 2 }) => {
 
+  // Reused on every retry so the backend can replay a generation it already finished
+  const idempotencyKey = crypto.randomUUID();
+
   const makeRequest = async (attempt = 1) => {
     try {
       const response = await axios({
@@ -15,6 +18,7 @@ const APIService = async ({ question, onResponse, retries = 2 }) => {
         timeout: 120000,
         headers: {
           "Content-Type": "application/json",
+          "Idempotency-Key": idempotencyKey,
         },
       });
 
@@ -49,6 +53,8 @@ const APIService = async ({ question, onResponse, retries = 2 }) => {
 // TextTool specific API services
 export const TextToolAPI = {
   newEmail: async (data, onResponse, retries = 2) => {
+    const idempotencyKey = crypto.randomUUID();
+
     const makeRequest = async (attempt = 1) => {
       try {
         const response = await axios({
@@ -58,6 +64,7 @@ export const TextToolAPI = {
           timeout: 120000,
           headers: {
             "Content-Type": "application/json",
+            "Idempotency-Key": idempotencyKey,
           },
         });
 
@@ -87,6 +94,8 @@ export const TextToolAPI = {
   },
 
   replyEmail: async (data, onResponse, retries = 2) => {
+    const idempotencyKey = crypto.randomUUID();
+
     const makeRequest = async (attempt = 1) => {
       try {
         const response = await axios({
@@ -96,6 +105,7 @@ export const TextToolAPI = {
           timeout: 120000,
           headers: {
             "Content-Type": "application/json",
+            "Idempotency-Key": idempotencyKey,
           },
         });
 
@@ -126,6 +136,8 @@ export const TextToolAPI = {
 
   // Report Generation APIs
   internshipReport: async (data, onResponse, retries = 2) => {
+    const idempotencyKey = crypto.randomUUID();
+
     const makeRequest = async (attempt = 1) => {
       try {
         const response = await axios({
@@ -135,6 +147,7 @@ export const TextToolAPI = {
           timeout: 120000,
           headers: {
             "Content-Type": "application/json",
+            "Idempotency-Key": idempotencyKey,
           },
         });
 
@@ -164,6 +177,8 @@ export const TextToolAPI = {
   },
 
   projectReport: async (data, onResponse, retries = 2) => {
+    const idempotencyKey = crypto.randomUUID();
+
     const makeRequest = async (attempt = 1) => {
       try {
         const response = await axios({
@@ -173,6 +188,7 @@ export const TextToolAPI = {
           timeout: 120000,
           headers: {
             "Content-Type": "application/json",
+            "Idempotency-Key": idempotencyKey,
           },
         });
 
@@ -202,6 +218,8 @@ export const TextToolAPI = {
   },
 
   technicalReport: async (data, onResponse, retries = 2) => {
+    const idempotencyKey = crypto.randomUUID();
+
     const makeRequest = async (attempt = 1) => {
       try {
         const response = await axios({
@@ -211,6 +229,7 @@ export const TextToolAPI = {
           timeout: 120000,
           headers: {
             "Content-Type": "application/json",
+            "Idempotency-Key": idempotencyKey,
           },
         });
 
@@ -240,6 +259,8 @@ export const TextToolAPI = {
   },
 
   businessMarketReport: async (data, onResponse, retries = 2) => {
+    const idempotencyKey = crypto.randomUUID();
+
     const makeRequest = async (attempt = 1) => {
       try {
         const response = await axios({
@@ -249,6 +270,7 @@ export const TextToolAPI = {
           timeout: 120000,
           headers: {
             "Content-Type": "application/json",
+            "Idempotency-Key": idempotencyKey,
           },
         });
 
@@ -278,6 +300,8 @@ export const TextToolAPI = {
   },
 
   incidentStatusReport: async (data, onResponse, retries = 2) => {
+    const idempotencyKey = crypto.randomUUID();
+
     const makeRequest = async (attempt = 1) => {
       try {
         const response = await axios({
@@ -287,6 +311,7 @@ export const TextToolAPI = {
           timeout: 120000,
           headers: {
             "Content-Type": "application/json",
+            "Idempotency-Key": idempotencyKey,
           },
         });
 
@@ -316,6 +341,8 @@ export const TextToolAPI = {
   },
 
   generateBlog: async (data, onResponse, retries = 2) => {
+    const idempotencyKey = crypto.randomUUID();
+
     const makeRequest = async (attempt = 1) => {
       try {
         const response = await axios({
@@ -325,6 +352,7 @@ export const TextToolAPI = {
           timeout: 120000,
           headers: {
             "Content-Type": "application/json",
+            "Idempotency-Key": idempotencyKey,
           },
         });
 
@@ -354,6 +382,8 @@ export const TextToolAPI = {
   },
 
   generateLetter: async (data, onResponse, retries = 2) => {
+    const idempotencyKey = crypto.randomUUID();
+
     const makeRequest = async (attempt = 1) => {
       try {
         const response = await axios({
@@ -363,6 +393,7 @@ export const TextToolAPI = {
           timeout: 120000,
           headers: {
             "Content-Type": "application/json",
+            "Idempotency-Key": idempotencyKey,
           },
         });
 
@@ -392,6 +423,8 @@ export const TextToolAPI = {
   },
 
   generateTextIntelligence: async (data, onResponse, retries = 2) => {
+    const idempotencyKey = crypto.randomUUID();
+
     const makeRequest = async (attempt = 1) => {
       try {
         const response = await axios({
@@ -401,6 +434,7 @@ export const TextToolAPI = {
           timeout: 120000,
           headers: {
             "Content-Type": "application/json",
+            "Idempotency-Key": idempotencyKey,
           },
         });
 
@@ -433,6 +467,8 @@ export const TextToolAPI = {
 // Agreements specific API services
 export const AgreementsAPI = {
   generateTemplate: async (data, onResponse, retries = 2) => {
+    const idempotencyKey = crypto.randomUUID();
+
     const makeRequest = async (attempt = 1) => {
       try {
         const response = await axios({
@@ -442,6 +478,7 @@ export const AgreementsAPI = {
           timeout: 120000,
           headers: {
             "Content-Type": "application/json",
+            "Idempotency-Key": idempotencyKey,
           },
         });
 
@@ -471,6 +508,8 @@ export const AgreementsAPI = {
   },
 
   generateAgreement: async (data, onResponse, retries = 2) => {
+    const idempotencyKey = crypto.randomUUID();
+
     const makeRequest = async (attempt = 1) => {
       try {
         const response = await axios({
@@ -480,6 +519,7 @@ export const AgreementsAPI = {
           timeout: 120000,
           headers: {
             "Content-Type": "application/json",
+            "Idempotency-Key": idempotencyKey,
           },
         });
 
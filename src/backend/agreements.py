@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
-import requests
-import os
 from dotenv import load_dotenv
+from generation import generation_response
+from idempotency import idempotent
 
 load_dotenv()
 
@@ -19,46 +19,8 @@ If query unclear, ask before answering.
 # Create Blueprint for Agreements routes
 agreements_bp = Blueprint('agreements', __name__, url_prefix='/agreements')
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-def call_gemini_api(prompt):
-    """Helper function to call Gemini API"""
-    try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-        
-        payload = {
-            "contents": [
-                {
-                    "parts": [{"text": prompt}]
-                }
-            ],
-            "generationConfig": {
-                "maxOutputTokens": 2048,
-                "temperature": 0.7
-            }
-        }
-
-        response = requests.post(
-            url,
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=120
-        )
-
-        if response.status_code != 200:
-            return {
-                "error": "Gemini API failed",
-                "details": response.text
-            }, response.status_code
-
-        return response.json(), 200
-
-    except requests.exceptions.Timeout:
-        return {"error": "Request timed out"}, 504
-    except Exception as e:
-        return {"error": str(e)}, 500
-
 @agreements_bp.route("/generate-template", methods=["POST"])
+@idempotent
 def generate_template():
     """Generate a professional agreement template"""
     try:
@@ -94,13 +56,13 @@ Ensure the template maintains clarity, authority, and readability, reflecting th
 ⚖ This template should not contain actual party-specific information, but be ready for such data to be inserted.
 🖋 The style should reflect that of a learned senior solicitor of over 20 years' experience in corporate law practice."""
 
-        result, status_code = call_gemini_api(prompt)
-        return jsonify(result), status_code
+        return generation_response(prompt, cache=True)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @agreements_bp.route("/generate-agreement", methods=["POST"])
+@idempotent
 def generate_agreement():
     """Generate a complete legally binding agreement"""
     try:
@@ -147,8 +109,7 @@ Governing Law: {data['governingLaw']}
 Special Clauses: {data['specialClauses']}
 Signature Names: {data['signatureNames']}"""
 
-        result, status_code = call_gemini_api(prompt)
-        return jsonify(result), status_code
+        return generation_response(prompt)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
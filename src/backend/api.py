@@ -1,19 +1,19 @@
 from flask import Blueprint, request, jsonify
-import os
+import logging
 from dotenv import load_dotenv
-from google import genai
+from gemini_client import generate_content, response_text
+from idempotency import idempotent
+import tracing
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 # Create Blueprint for API routes
 api_bp = Blueprint('api', __name__)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-print("Gemini API KEY :", GEMINI_API_KEY)
-
-client = genai.Client(api_key=GEMINI_API_KEY)
-
 @api_bp.route("/generate", methods=["POST", "OPTIONS"])
+@idempotent
 def generate():
 
     # Handle preflight FIRST
@@ -28,26 +28,28 @@ def generate():
         question = data.get("question")
         if not question:
             return jsonify({"error": "Question is required"}), 400
+        tracing.mark("validate")
 
-        response = client.models.generate_content(
-            model="gemini-3-flash-preview",
-            contents=[{"role": "user", "parts": [{"text": question}]}]
+        result, status_code = generate_content(
+            [{"role": "user", "parts": [{"text": question}]}],
+            model="gemini-3-flash-preview"
         )
-        print(response.text)
-        if not response or not response.text:
+        text = response_text(result) if status_code == 200 else ""
+        log.info("generated answer", extra=tracing.fields(question=tracing.payload(question), answer=tracing.payload(text)))
+        if not text:
             return jsonify({
                 "error": "Gemini API failed",
-                "details": "No content returned"
+                "details": result.get("details", "No content returned")
             }), 500
 
         return jsonify({
             "candidates": [{
                 "content": {
-                    "parts": [{"text": response.text}]
+                    "parts": [{"text": text}]
                 }
             }]
         })
 
     except Exception as e:
-        print("API ERROR:", e)
+        log.exception("API error")
         return jsonify({"error": "Internal server error"}), 500
@@ -1,26 +1,51 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
 from dotenv import load_dotenv
+import tracing
+
+# Route logging through the queue handler before the blueprints log anything at import
+tracing.setup_logging()
 
 # Import blueprints
 from api import api_bp
 from texttool import texttool_bp
 from agreements import agreements_bp
 from business_strategist import business_strategist_bp
+from jobs import jobs_bp
+import response_cache
+import extraction_cache
+import gemini_client
+import cassette
+import metrics
+import uploads
 
 load_dotenv()
 
 # Initialize Flask app
 app = Flask(__name__)
+# Uploads are capped and spooled to disk rather than held in worker memory
+app.request_class = uploads.SpoolingRequest
+app.config["MAX_CONTENT_LENGTH"] = uploads.MAX_CONTENT_LENGTH
 
 # Configure CORS to allow specific origins
-CORS(app, resources={r"/*": {"origins": ["http://localhost:5173", "https://ai4cs.in", "https://ai.onewebmart.com"]}})
+CORS(app, resources={r"/*": {"origins": ["http://localhost:5173", "https://ai4cs.in", "https://ai.onewebmart.com"]}},
+     expose_headers=[tracing.TRACE_HEADER, "Server-Timing"])
+
+# Trace ids, phase timings (Server-Timing) and queued, structured logging
+tracing.init_app(app)
 
 # Register blueprints with proper URL prefixes
 app.register_blueprint(api_bp, url_prefix='/api')
 app.register_blueprint(texttool_bp, url_prefix='/texttool')
 app.register_blueprint(agreements_bp, url_prefix='/agreements')
 app.register_blueprint(business_strategist_bp, url_prefix='/business-strategist')
+app.register_blueprint(jobs_bp, url_prefix='/jobs')
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    limit_mb = app.config["MAX_CONTENT_LENGTH"] / (1024 * 1024)
+    return jsonify({"error": f"Request too large (limit {limit_mb:g} MB)"}), 413
 
 # Legacy route for backward compatibility
 @app.route('/generate', methods=['POST', 'OPTIONS'])
@@ -37,6 +62,31 @@ def legacy_generate():
         from api import generate as api_generate
         return api_generate()
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Response cache hit rate and bytes stored (counters are per worker)"""
+    return jsonify(response_cache.stats())
+
+@app.route('/extraction-cache/stats', methods=['GET'])
+def extraction_cache_stats():
+    """Extraction cache hit rate (per worker) and entries and bytes stored"""
+    return jsonify(extraction_cache.stats())
+
+@app.route('/singleflight/stats', methods=['GET'])
+def singleflight_stats():
+    """Upstream calls executed vs. saved by coalescing identical in-flight requests (per worker)"""
+    return jsonify(gemini_client.inflight.stats())
+
+@app.route('/cassette/stats', methods=['GET'])
+def cassette_stats():
+    """Upstream calls recorded or replayed from the cassette (per worker) and pairs stored"""
+    return jsonify(cassette.stats())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Upstream usage, latency, estimated cost and queue wait for all workers, in Prometheus text format"""
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.route('/')
 def home():
     return jsonify({
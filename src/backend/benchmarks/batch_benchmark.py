@@ -0,0 +1,116 @@
+"""Wall time of /texttool/extract-batch against the slowest file and the sum of all files.
+
+Builds a batch of PDFs of mixed sizes (one large, the rest small, like a
+filing with its annexures), zips them, and posts the ZIP to the batch
+endpoint through the Flask test client in a fresh process per pool size.
+"serial" disables the pool (EXTRACT_PROCESSES=1); "pool xN" extracts up to
+N files at a time. Each file is also timed alone to give the slowest-file
+and sum-of-files references.
+
+The same files are then posted directly (not zipped). That request is
+larger than UPLOAD_SPOOL_BYTES, so the uploads are spooled to disk and must
+still be readable while the response streams; the run fails if any of them
+is not extracted. Run from src/backend:
+
+    python benchmarks/batch_benchmark.py --files 8 --pages 400 --repeat 3 --processes 2,4
+"""
+import os
+import io
+import sys
+import json
+import time
+import zipfile
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import run_in_child
+import uploads
+from extract_benchmark import build_pdf
+
+
+def build_batch(directory, files, pages):
+    """The largest file has `pages` pages, the others a quarter of that; returns the ZIP path"""
+    paths = []
+    for number in range(files):
+        path = os.path.join(directory, f"annexure-{number + 1}.pdf")
+        build_pdf(path, pages if number == 0 else max(1, pages // 4), seed=number)
+        paths.append(path)
+    archive = os.path.join(directory, "batch.zip")
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        for path in paths:
+            z.write(path, os.path.basename(path))
+    return paths, archive
+
+
+def _child(processes, paths, archive):
+    import extraction
+    extraction.EXTRACT_PROCESSES = processes
+    # Every run extracts for real
+    import extraction_cache
+    extraction_cache.CACHE_ENABLED = False
+    from app import app
+    client = app.test_client()
+    if processes > 1:
+        # Pool start-up is paid once per gunicorn worker, not per request
+        pool = extraction._process_pool()
+        list(pool.map(abs, range(processes * 4)))
+
+    singles = []
+    for path in paths:
+        started = time.perf_counter()
+        extraction.extract_pdf(path)
+        singles.append(time.perf_counter() - started)
+
+    with open(archive, "rb") as f:
+        data = f.read()
+    started = time.perf_counter()
+    response = client.post("/texttool/extract-batch", data={"files": [(io.BytesIO(data), "batch.zip")]})
+    lines = [json.loads(line) for line in response.data.decode("utf-8").splitlines()]
+    elapsed = time.perf_counter() - started
+    response.close()
+
+    direct = []
+    for path in paths:
+        with open(path, "rb") as f:
+            direct.append((io.BytesIO(f.read()), os.path.basename(path)))
+    response = client.post("/texttool/extract-batch", data={"files": direct})
+    direct_lines = [json.loads(line) for line in response.data.decode("utf-8").splitlines()]
+    response.close()
+    extraction.shutdown_pool()
+    return elapsed, max(singles), sum(singles), lines[-1]["succeeded"], direct_lines[-1]["succeeded"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=400, help="pages of the largest file")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--processes", default="2,4", help="pool sizes to compare with serial")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("AI4CS_DATA_DIR", tmp)
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        paths, archive = build_batch(tmp, args.files, args.pages)
+        direct_bytes = sum(os.path.getsize(path) for path in paths)
+        if direct_bytes <= uploads.UPLOAD_SPOOL_BYTES:
+            parser.error(f"the files total {direct_bytes} bytes; raise --pages so they exceed "
+                         f"UPLOAD_SPOOL_BYTES ({uploads.UPLOAD_SPOOL_BYTES}) and get spooled")
+        print(f"{args.files} PDFs ({args.pages} + {args.files - 1} x {max(1, args.pages // 4)} pages), "
+              f"{os.path.getsize(archive) / 1e6:.1f} MB zipped\n")
+
+        print(f"{'mode':<10} {'best s':>8} {'median s':>9} {'slowest s':>10} {'sum s':>8} {'ok':>4} {'direct ok':>10}")
+        cases = [("serial", 1)] + [(f"pool x{n}", int(n)) for n in args.processes.split(",") if n]
+        for label, processes in cases:
+            runs = sorted(run_in_child(_child, processes, paths, archive) for _ in range(args.repeat))
+            best, median = runs[0][0], runs[len(runs) // 2][0]
+            print(f"{label:<10} {best:>8.3f} {median:>9.3f} {runs[0][1]:>10.3f} {runs[0][2]:>8.3f} "
+                  f"{runs[0][3]:>4} {runs[0][4]:>10}")
+            if any(run[4] != args.files for run in runs):
+                sys.exit(f"{label}: spooled direct uploads were not all extracted")
+        print(f"\n{os.cpu_count()} CPUs; 'slowest' and 'sum' time each file alone in the same process")
+
+
+if __name__ == "__main__":
+    main()
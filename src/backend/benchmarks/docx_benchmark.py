@@ -0,0 +1,117 @@
+"""Time and peak memory of DOCX text extraction: python-docx object model vs the streaming extractor.
+
+Builds a contract-sized DOCX (paragraphs with tab stops, schedules as
+tables, a header and a footer) with python-docx, checks that the streaming
+extractor reads body paragraphs exactly as python-docx does, then
+extracts it in a fresh process per run:
+
+  python-docx  the old path: docx.Document(...) and doc.paragraphs (tables are dropped)
+  streaming    extraction.extract_docx: iterparse straight from the zip, tables included
+
+Run from src/backend:
+
+    python benchmarks/docx_benchmark.py --paragraphs 20000 --tables 200 --repeat 3
+"""
+import os
+import sys
+import time
+import random
+import zipfile
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import MB, PeakRss, run_in_child
+from extract_benchmark import WORDS
+
+
+def build_docx(path, paragraphs, tables, seed=7):
+    import docx
+    from docx.shared import Cm
+    rng = random.Random(seed)
+    doc = docx.Document()
+    doc.sections[0].header.paragraphs[0].text = "Strictly confidential - Shareholders' agreement"
+    doc.sections[0].footer.paragraphs[0].text = "Initials of the parties: ______"
+    every = max(1, paragraphs // max(tables, 1))
+    for number in range(paragraphs):
+        para = doc.add_paragraph(f"{number + 1}.")
+        # Custom tab stops (w:pPr/w:tabs/w:tab) are formatting, only the run's tab is text
+        para.paragraph_format.tab_stops.add_tab_stop(Cm(1.5))
+        para.paragraph_format.tab_stops.add_tab_stop(Cm(3))
+        para.add_run("\t" + " ".join(rng.choice(WORDS) for _ in range(40)))
+        if tables and number % every == every - 1:
+            table = doc.add_table(rows=20, cols=4)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = " ".join(rng.choice(WORDS) for _ in range(3))
+    doc.save(path)
+
+
+def _python_docx(path):
+    import docx
+    doc = docx.Document(path)
+    return len("\n".join(para.text for para in doc.paragraphs))
+
+
+def _streaming(path):
+    import extraction
+    return len(extraction.extract_docx(path)["text"])
+
+
+METHODS = {"python-docx": _python_docx, "streaming": _streaming}
+
+
+def check_paragraphs(path):
+    """Raise unless the streaming extractor reads the body of a table-free DOCX exactly as python-docx does"""
+    import docx
+    import extraction
+    expected = [para.text for para in docx.Document(path).paragraphs]
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as part:
+        actual = list(extraction._iter_wordml_blocks(part))
+    if actual != expected:
+        first = next(i for i, (a, b) in enumerate(zip(actual + [None], expected + [None])) if a != b)
+        raise SystemExit(f"paragraph {first} differs: streaming {actual[first:first + 1]!r} "
+                         f"vs python-docx {expected[first:first + 1]!r}")
+    return len(expected)
+
+
+def _child(method, path):
+    # Import cost is not part of the measurement
+    if method == "python-docx":
+        import docx  # noqa: F401
+    else:
+        import extraction  # noqa: F401
+    # Current RSS sampled during the run: the high-water mark (ru_maxrss) is often set by the imports
+    watch = PeakRss()
+    started = time.perf_counter()
+    chars = METHODS[method](path)
+    elapsed = time.perf_counter() - started
+    return elapsed, chars, watch.stop() / MB
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paragraphs", type=int, default=20000)
+    parser.add_argument("--tables", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # python-docx's doc.paragraphs leaves tables out, so the parity check uses a document without them
+        parity = os.path.join(tmp, "parity.docx")
+        build_docx(parity, 500, 0)
+        print(f"parity with python-docx: {check_paragraphs(parity)} paragraphs identical")
+
+        path = os.path.join(tmp, "contract.docx")
+        build_docx(path, args.paragraphs, args.tables)
+        print(f"{args.paragraphs} paragraphs, {args.tables} tables, {os.path.getsize(path) / 1e6:.1f} MB\n")
+
+        print(f"{'method':<12} {'best s':>8} {'median s':>9} {'chars':>10} {'peak +MB':>9}")
+        for method in METHODS:
+            runs = sorted(run_in_child(_child, method, path) for _ in range(args.repeat))
+            print(f"{method:<12} {runs[0][0]:>8.3f} {runs[len(runs) // 2][0]:>9.3f} {runs[0][1]:>10} "
+                  f"{max(r[2] for r in runs):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Time and peak memory of PDF text extraction on a large synthetic filing.
+
+Builds an N-page PDF of dense filing-like text, then extracts it in a fresh
+process per method so each peak RSS is measured on its own:
+
+  concat   the old path: content += page.get_text() over every page
+  pages    extraction.extract_pdf: one page at a time, joined once
+  limited  extract_pdf with --max-pages (early exit)
+  ndjson   extraction.stream_pdf, consumed line by line as a client would
+  parallel extract_pdf split across a warm pool of N processes (--processes)
+
+Run from src/backend:
+
+    python benchmarks/extract_benchmark.py --pages 600 --repeat 3 --processes 2,4,8
+"""
+import os
+import sys
+import time
+import random
+import resource
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import run_in_child
+
+WORDS = ("company board resolution shareholder dividend auditor liability provision revenue segment "
+         "consolidated statement cash flow equity reserve director remuneration related party "
+         "contingent disclosure subsidiary impairment deferred tax financial year ended march").split()
+
+
+def build_pdf(path, pages, seed=7):
+    import fitz
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        lines = [f"Annual report - page {number + 1}"]
+        for _ in range(60):
+            lines.append(" ".join(rng.choice(WORDS) for _ in range(12)))
+        page.insert_textbox(page.rect + (36, 36, -36, -36), "\n".join(lines), fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def _concat(data, options):
+    import fitz
+    content = ""
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for page in doc:
+            content += page.get_text()
+    return len(content)
+
+
+def _pages(data, options):
+    import extraction
+    return len(extraction.extract_pdf(data)["text"])
+
+
+def _limited(data, options):
+    import extraction
+    return len(extraction.extract_pdf(data, max_pages=options["max_pages"])["text"])
+
+
+def _ndjson(data, options):
+    import extraction
+    return sum(len(line) for line in extraction.stream_pdf(data))
+
+
+def _parallel(data, options):
+    import extraction
+    return len(extraction.extract_pdf(data)["text"])
+
+
+METHODS = {"concat": _concat, "pages": _pages, "limited": _limited, "ndjson": _ndjson, "parallel": _parallel}
+
+
+def _child(method, path, options):
+    import fitz  # noqa: F401 -- import cost is not part of the measurement
+    import extraction
+    extraction.EXTRACT_PROCESSES = options.get("processes", 1)
+    extraction.EXTRACT_PARALLEL_MIN_PAGES = 1
+    if extraction.EXTRACT_PROCESSES > 1:
+        # Pool start-up is paid once per gunicorn worker, not per request
+        pool = extraction._process_pool()
+        list(pool.map(abs, range(extraction.EXTRACT_PROCESSES * 4)))
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        data = f.read()
+    chars = METHODS[method](data, options)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Pool processes are children of this one; it cannot exit until they do
+    extraction.shutdown_pool()
+    return elapsed, chars, (peak - before) / 1024, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=600)
+    parser.add_argument("--max-pages", type=int, default=50, help="limit for the 'limited' method")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--methods", default="concat,pages,limited,ndjson")
+    parser.add_argument("--processes", default="2,4", help="pool sizes for the 'parallel' method")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "filing.pdf")
+        started = time.perf_counter()
+        build_pdf(path, args.pages)
+        print(f"{args.pages}-page PDF, {os.path.getsize(path) / 1e6:.1f} MB, "
+              f"built in {time.perf_counter() - started:.1f}s\n")
+
+        runs_by_label = {}
+        print(f"{'method':<12} {'best s':>8} {'median s':>9} {'chars':>10} {'peak +MB':>9} {'peak MB':>8} {'speedup':>8}")
+        cases = [(method, method, {}) for method in args.methods.split(",")]
+        cases += [(f"parallel x{n}", "parallel", {"processes": int(n)}) for n in args.processes.split(",") if n]
+        for label, method, options in cases:
+            options["max_pages"] = args.max_pages
+            runs = sorted(run_in_child(_child, method, path, options) for _ in range(args.repeat))
+            runs_by_label[label] = runs
+            best, median = runs[0][0], runs[len(runs) // 2][0]
+            growth = max(r[2] for r in runs)
+            peak = max(r[3] for r in runs)
+            serial = runs_by_label.get("pages")
+            speedup = f"{serial[0][0] / best:.2f}x" if serial and method != "limited" else "-"
+            print(f"{label:<12} {best:>8.3f} {median:>9.3f} {runs[0][1]:>10} {growth:>9.1f} {peak:>8.1f} {speedup:>8}")
+        print(f"\n{os.cpu_count()} CPUs; speedup is against the serial 'pages' method")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Local stand-in for the Gemini generateContent and streamGenerateContent APIs, for benchmarks.
+
+Point the backend at it with GEMINI_API_BASE=http://127.0.0.1:<port>/v1beta.
+Latency before the first token is drawn from a configurable distribution
+(scaled per model), output is produced at a fixed token rate, and a share of
+calls can be failed with 500s or rate limited with 429s.
+
+    python benchmarks/fake_gemini.py --port 8765 --latency 0.5 --distribution lognormal \\
+        --tokens-per-second 80 --output-tokens 300 --error-rate 0.01 --rate-limit-rate 0.02 \\
+        --model-latency gemini-2.5-flash=1.6
+"""
+import re
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+_MODEL_PATH = re.compile(r"/models/([^/:]+):(generateContent|streamGenerateContent)$")
+_FILLER = "the plan focuses on customers margin growth and clear next steps for the team".split()
+# Output tokens per streamed chunk, roughly what Gemini sends
+_CHUNK_TOKENS = 8
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Overridden per server by serve()
+    latency = 0.5
+    distribution = "fixed"
+    jitter = 0.0
+    tokens_per_second = 0.0
+    output_tokens = 8
+    error_rate = 0.0
+    rate_limit_rate = 0.0
+    model_latency = {}
+    rng = random.Random()
+    stats = None
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        url = urlparse(self.path)
+        match = _MODEL_PATH.search(url.path)
+        if match is None:
+            return self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {url.path}"}})
+        model, method = match.groups()
+
+        prompt_chars = sum(
+            len(part.get("text", ""))
+            for message in payload.get("contents", [])
+            for part in message.get("parts", [])
+        )
+
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            roll = self.rng.random()
+            first_token_delay = self._first_token_delay(model)
+        if roll < self.rate_limit_rate:
+            self._count("rate_limited")
+            return self._send_json(429, {"error": {"code": 429, "message": "Resource has been exhausted",
+                                                   "status": "RESOURCE_EXHAUSTED"}}, {"Retry-After": "1"})
+        if roll < self.rate_limit_rate + self.error_rate:
+            self._count("errors")
+            time.sleep(first_token_delay)
+            return self._send_json(500, {"error": {"code": 500, "message": "Internal error", "status": "INTERNAL"}})
+
+        output_tokens = min(payload.get("generationConfig", {}).get("maxOutputTokens", self.output_tokens),
+                            self.output_tokens)
+        text = self._text(prompt_chars, output_tokens)
+        usage = {"promptTokenCount": prompt_chars // 4, "candidatesTokenCount": output_tokens,
+                 "totalTokenCount": prompt_chars // 4 + output_tokens}
+
+        time.sleep(first_token_delay)
+        if method == "streamGenerateContent" and parse_qs(url.query).get("alt") == ["sse"]:
+            self._count("streamed")
+            return self._stream(text, output_tokens, usage)
+
+        if self.tokens_per_second > 0:
+            time.sleep(output_tokens / self.tokens_per_second)
+        self._count("completed")
+        self._send_json(200, self._response(text, usage, "STOP"))
+
+    def _first_token_delay(self, model):
+        # Caller holds stats_lock (self.rng is shared)
+        mean = self.latency * self.model_latency.get(model, 1.0)
+        if self.distribution == "uniform":
+            delay = self.rng.uniform(mean - self.jitter, mean + self.jitter)
+        elif self.distribution == "normal":
+            delay = self.rng.gauss(mean, self.jitter)
+        elif self.distribution == "lognormal":
+            # `jitter` is the sigma of the underlying normal; the median stays at `mean`
+            delay = self.rng.lognormvariate(math.log(mean), self.jitter) if mean > 0 else 0.0
+        elif self.distribution == "exponential":
+            delay = self.rng.expovariate(1 / mean) if mean > 0 else 0.0
+        else:
+            delay = mean
+        return max(0.0, delay)
+
+    def _text(self, prompt_chars, output_tokens):
+        words = [f"Fake response to {prompt_chars} prompt characters."]
+        # About one token per word
+        while len(words) < output_tokens:
+            words.append(_FILLER[len(words) % len(_FILLER)])
+        return " ".join(words[:max(output_tokens, 1)])
+
+    def _response(self, text, usage, finish_reason):
+        body = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+        if finish_reason:
+            body["candidates"][0]["finishReason"] = finish_reason
+        if usage:
+            body["usageMetadata"] = usage
+        return body
+
+    def _stream(self, text, output_tokens, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        words = text.split(" ")
+        chunks = [" ".join(words[i:i + _CHUNK_TOKENS]) for i in range(0, len(words), _CHUNK_TOKENS)] or [""]
+        for index, chunk in enumerate(chunks):
+            last = index == len(chunks) - 1
+            if index and self.tokens_per_second > 0:
+                time.sleep(_CHUNK_TOKENS / self.tokens_per_second)
+            piece = chunk if index == 0 else " " + chunk
+            event = self._response(piece, usage if last else None, "STOP" if last else None)
+            self._write_chunk(f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8"))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _count(self, name):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+
+def serve(port, latency=0.5, distribution="fixed", jitter=0.0, tokens_per_second=0.0, output_tokens=8,
+          error_rate=0.0, rate_limit_rate=0.0, model_latency=None, seed=None):
+    """Start the fake server on a background thread and return it (call .shutdown() to stop).
+
+    `server.stats` counts requests, completed, streamed, errors and rate_limited calls.
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown latency distribution: {distribution}")
+    stats = {"requests": 0, "completed": 0, "streamed": 0, "errors": 0, "rate_limited": 0}
+    handler = type("Handler", (FakeGeminiHandler,), {
+        "latency": latency,
+        "distribution": distribution,
+        "jitter": jitter,
+        "tokens_per_second": tokens_per_second,
+        "output_tokens": output_tokens,
+        "error_rate": error_rate,
+        "rate_limit_rate": rate_limit_rate,
+        "model_latency": dict(model_latency or {}),
+        "rng": random.Random(seed),
+        "stats": stats,
+        "stats_lock": threading.Lock()
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_model_latency(values):
+    """["model=1.5", ...] -> {"model": 1.5}"""
+    result = {}
+    for value in values or []:
+        model, _, factor = value.partition("=")
+        result[model] = float(factor)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean (median for lognormal) seconds to the first token")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="half-width (uniform), standard deviation (normal) or sigma (lognormal)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="output token rate; 0 is instant")
+    parser.add_argument("--output-tokens", type=int, default=8)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls failed with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of calls rejected with 429")
+    parser.add_argument("--model-latency", action="append", metavar="MODEL=FACTOR",
+                        help="scale the latency for one model (repeatable)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    serve(args.port, args.latency, args.distribution, args.jitter, args.tokens_per_second, args.output_tokens,
+          args.error_rate, args.rate_limit_rate, parse_model_latency(args.model_latency), args.seed)
+    print(f"Fake Gemini listening on http://127.0.0.1:{args.port}/v1beta")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,85 @@
+"""Helpers shared by the benchmarks: backend import path, ports, percentiles,
+RSS sampling and running a measurement in a fresh process.
+
+Importing this module puts src/backend on sys.path, so benchmarks can import
+the backend modules directly.
+"""
+import os
+import sys
+import socket
+import traceback
+import multiprocessing
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from uploads import PeakRss  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def process_tree_rss_bytes(pid):
+    """Sum VmRSS of a process and its children (Linux only)"""
+    total_kb = 0
+    pids = [str(pid)]
+    try:
+        pids += open(f"/proc/{pid}/task/{pid}/children").read().split()
+    except OSError:
+        pass
+    for p in pids:
+        try:
+            for line in open(f"/proc/{p}/status"):
+                if line.startswith("VmRSS:"):
+                    total_kb += int(line.split()[1])
+        except OSError:
+            pass
+    return total_kb * 1024
+
+
+def process_tree_rss_mb(pid):
+    return round(process_tree_rss_bytes(pid) / MB, 1)
+
+
+def peak_tree_rss(pid, interval=0.1):
+    """PeakRss over a process and its children (e.g. a gunicorn arbiter and its workers); use as a context manager"""
+    return PeakRss(sample=lambda: process_tree_rss_bytes(pid), interval=interval)
+
+
+def _child_main(function, args, results):
+    try:
+        results.put((True, function(*args)))
+    except BaseException:
+        results.put((False, traceback.format_exc()))
+
+
+def run_in_child(function, *args):
+    """Return function(*args) computed in a freshly spawned process.
+
+    Each measurement then starts from a clean interpreter, so peak memory and
+    warm caches from earlier runs don't leak into it. `function` must be a
+    module-level function.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_child_main, args=(function, args, results))
+    process.start()
+    ok, value = results.get()
+    process.join()
+    if not ok:
+        raise RuntimeError(f"benchmark child failed:\n{value}")
+    return value
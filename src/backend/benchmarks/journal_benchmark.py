@@ -0,0 +1,159 @@
+"""Write cost of the strategist session backends, per consultation turn.
+
+Plays the same synthetic consultations against each backend and reports
+the time and bytes written per save, then how long a fresh worker takes to
+replay the resulting journal (before and after compaction). Run from
+src/backend:
+
+    python benchmarks/journal_benchmark.py --sessions 200 --turns 12
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import percentile
+from session_store import MemorySessionStore, JournaledSessionStore, SqliteSessionStore, encode_session
+
+
+WORDS = (
+    "revenue margin customer churn pricing channel retail growth cost supplier team market share "
+    "competitor brand segment forecast cash flow hiring budget region product launch risk quarter"
+).split()
+
+
+def prose(rng, length):
+    # Random words so the text compresses like real answers rather than a repeated phrase
+    words = []
+    while sum(len(word) + 1 for word in words) < length:
+        words.append(rng.choice(WORDS))
+    return " ".join(words)[:length]
+
+
+def new_session():
+    return {
+        "function_type": "business_diagnosis",
+        "question_count": 1,
+        "phase": "intake",
+        "slots": [],
+        "upstream_calls": 0,
+        "calls_saved": 1,
+        "turns": [
+            {"role": "user", "kind": "start", "text": ""},
+            {"role": "model", "kind": "reply", "text": "What is your industry and business size?"}
+        ]
+    }
+
+
+def play_turn(session, turn, rng):
+    """Mutate `session` the way one strategist turn does"""
+    answer = prose(rng, 220)
+    reply_length = 6000 if turn % 6 == 5 else 600
+    session["question_count"] += 1
+    session["slots"].append({"question": f"Question {turn}", "answer": answer})
+    session["turns"].append({"role": "user", "kind": "answer", "text": answer})
+    session["turns"].append({"role": "model", "kind": "reply", "text": prose(rng, reply_length)})
+    session["upstream_calls"] += 1
+
+
+def run_writes(store, sessions, turns):
+    """Save every session after each turn; returns per-save latencies in seconds and the
+    bytes a full-session rewrite stores (compressed, as in the SQLite backend)"""
+    rng = random.Random(42)
+    latencies = []
+    full_bytes = 0
+    live = {}
+    for index in range(sessions):
+        session_id = f"bench-{index}"
+        live[session_id] = new_session()
+        started = time.perf_counter()
+        store.save(session_id, live[session_id])
+        latencies.append(time.perf_counter() - started)
+
+    for turn in range(turns):
+        for session_id in live:
+            session = store.load(session_id)
+            play_turn(session, turn, rng)
+            full_bytes += len(zlib.compress(encode_session(session)))
+            started = time.perf_counter()
+            store.save(session_id, session)
+            latencies.append(time.perf_counter() - started)
+            live[session_id] = session
+    return latencies, full_bytes
+
+
+def summarize(name, latencies, bytes_written, saves):
+    return {
+        "backend": name,
+        "saves": saves,
+        "mean_us": round(sum(latencies) / len(latencies) * 1e6, 1),
+        "p50_us": round(percentile(latencies, 50) * 1e6, 1),
+        "p99_us": round(percentile(latencies, 99) * 1e6, 1),
+        "bytes_per_save": round(bytes_written / saves) if bytes_written is not None else None
+    }
+
+
+def timed_replay(path, limits):
+    started = time.perf_counter()
+    store = JournaledSessionStore(path=path, **limits)
+    return round((time.perf_counter() - started) * 1000, 1), store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    # Disable eviction and sweeping so every backend does the same work
+    limits = dict(max_entries=10 ** 9, max_bytes=10 ** 12, sweep_interval=0)
+    saves = args.sessions * (args.turns + 1)
+    results = []
+    replay = {}
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        latencies, full_bytes = run_writes(MemorySessionStore(**limits), args.sessions, args.turns)
+        results.append(summarize("memory (no persistence)", latencies, None, saves))
+
+        for fsync in (False, True):
+            path = os.path.join(data_dir, f"journal-{int(fsync)}")
+            store = JournaledSessionStore(path=path, fsync=fsync, compact_bytes=10 ** 12, **limits)
+            latencies, _ = run_writes(store, args.sessions, args.turns)
+            results.append(summarize(f"journal fsync={'on' if fsync else 'off'}", latencies, os.path.getsize(path), saves))
+
+        path = os.path.join(data_dir, "sessions.sqlite3")
+        store = SqliteSessionStore(path=path, **limits)
+        latencies, _ = run_writes(store, args.sessions, args.turns)
+        results.append(summarize("sqlite (full rewrite)", latencies, full_bytes, saves))
+
+        journal = os.path.join(data_dir, "journal-0")
+        replay["journal_bytes"] = os.path.getsize(journal)
+        replay["replay_ms"], store = timed_replay(journal, limits)
+        store.compact()
+        replay["compacted_bytes"] = os.path.getsize(journal)
+        replay["compacted_replay_ms"], _ = timed_replay(journal, limits)
+        replay["sessions"] = args.sessions
+        replay["full_rewrite_bytes"] = full_bytes
+
+    print(f"{'backend':<24} {'mean us':>9} {'p50 us':>9} {'p99 us':>9} {'bytes/save':>11}")
+    for row in results:
+        print(f"{row['backend']:<24} {row['mean_us']:>9} {row['p50_us']:>9} {row['p99_us']:>9} "
+              f"{row['bytes_per_save'] if row['bytes_per_save'] is not None else '-':>11}")
+    print(
+        f"\nReplay of {replay['sessions']} sessions: {replay['journal_bytes']} bytes in {replay['replay_ms']} ms; "
+        f"after compaction {replay['compacted_bytes']} bytes in {replay['compacted_replay_ms']} ms"
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"writes": results, "replay": replay}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""End-to-end throughput of every LLM-backed route against the fake Gemini server.
+
+For each worker count and default model, boots gunicorn against a local fake
+upstream and drives one scenario per route with concurrent clients. Reports
+throughput, p50/p95/p99 latency, errors and peak RSS, and writes them as a
+JSON baseline. With --compare, exits 1 when a scenario's throughput drops or
+its p95 latency rises by more than --tolerance against an earlier baseline.
+Run from src/backend:
+
+    python benchmarks/route_benchmark.py --workers 1,2 --models gemini-2.0-flash,gemini-2.5-flash \\
+        --output benchmarks/baselines/local.json
+    python benchmarks/route_benchmark.py --workers 1,2 --models gemini-2.0-flash,gemini-2.5-flash \\
+        --compare benchmarks/baselines/local.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_gemini import serve, parse_model_latency, DISTRIBUTIONS
+from harness import BACKEND_DIR, MB, free_port, percentile, peak_tree_rss
+from serving_benchmark import start_gunicorn, email_payload
+
+
+def timed_post(url, body, stream=False):
+    """POST and read the whole body; returns (seconds, ok)"""
+    started = time.perf_counter()
+    try:
+        response = requests.post(url, json=body, timeout=600, stream=stream)
+        content = response.content
+        ok = response.status_code == 200 and (not stream or b"event: done" in content)
+    except requests.exceptions.RequestException:
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def api_generate(base, i):
+    return [timed_post(f"{base}/api/generate", {"question": f"How should company {i} price its product?"})]
+
+
+def texttool_new_email(base, i):
+    return [timed_post(f"{base}/texttool/new-email", email_payload(i))]
+
+
+def texttool_new_email_stream(base, i):
+    return [timed_post(f"{base}/texttool/new-email?stream=1", email_payload(i), stream=True)]
+
+
+def texttool_summarize(base, i):
+    body = {
+        "operationType": "summarization", "summaryLength": "Short", "summaryStyle": "Bullet points",
+        "outputLanguage": "English", "content": f"Quarterly report {i}. " + "Revenue grew while costs held flat. " * 40
+    }
+    return [timed_post(f"{base}/texttool/generate-text-intelligence", body)]
+
+
+def agreements_generate(base, i):
+    body = {
+        "agreementType": "Service", "dateOfAgreement": "2026-01-01", "partyAName": f"Client {i}",
+        "partyADescription": "Company", "partyAAddress": "Mumbai", "partyBName": "Vendor",
+        "partyBDescription": "Consultancy", "partyBAddress": "Pune", "purpose": "Advisory services",
+        "effectiveDate": "2026-01-15", "duration": "12 months", "governingLaw": "India",
+        "specialClauses": "None", "signatureNames": "A, B"
+    }
+    return [timed_post(f"{base}/agreements/generate-agreement", body)]
+
+
+def strategist_consultation(base, i):
+    """A full intake: start, one answer per intake question, then the confirmation turn (upstream)"""
+    url = f"{base}/business-strategist/consultation"
+    started = time.perf_counter()
+    try:
+        response = requests.post(url, json={"type": "start", "function_type": "business_diagnosis"}, timeout=600)
+        session_id = response.json()["session_id"]
+    except (requests.exceptions.RequestException, ValueError, KeyError):
+        return [(time.perf_counter() - started, False)]
+
+    results = [(time.perf_counter() - started, response.status_code == 200)]
+    for turn in range(4):
+        answer = f"Answer {turn} for consultation {i}: retail, 40 staff, falling margins."
+        results.append(timed_post(url, {"type": "next", "session_id": session_id, "answer": answer}))
+    return results
+
+
+SCENARIOS = {
+    "api_generate": api_generate,
+    "texttool_new_email": texttool_new_email,
+    "texttool_new_email_stream": texttool_new_email_stream,
+    "texttool_summarize": texttool_summarize,
+    "agreements_generate": agreements_generate,
+    "strategist_consultation": strategist_consultation,
+}
+
+
+def run_scenario(base, scenario, iterations, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        batches = list(pool.map(lambda i: SCENARIOS[scenario](base, i), range(iterations)))
+    elapsed = time.perf_counter() - started
+
+    results = [result for batch in batches for result in batch]
+    latencies = [latency for latency, _ in results]
+    return {
+        "requests": len(results),
+        "errors": sum(1 for _, ok in results if not ok),
+        "wall_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1)
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Rows of `results` that regressed against `baseline`: lower throughput or higher p95 beyond `tolerance`"""
+    previous = {(row["scenario"], row["workers"], row["model"]): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        before = previous.get((row["scenario"], row["workers"], row["model"]))
+        if before is None:
+            continue
+        reasons = []
+        if row["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            reasons.append(f"throughput {before['throughput_rps']} -> {row['throughput_rps']} rps")
+        if row["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            reasons.append(f"p95 {before['p95_ms']} -> {row['p95_ms']} ms")
+        if reasons:
+            regressions.append((row, reasons))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of scenarios")
+    parser.add_argument("--workers", default="1,2", help="comma-separated gunicorn worker counts")
+    parser.add_argument("--models", default="gemini-2.0-flash",
+                        help="comma-separated GEMINI_DEFAULT_MODEL values (routes with a fixed model keep it)")
+    parser.add_argument("--worker-class", default="sync")
+    parser.add_argument("--iterations", type=int, default=40, help="scenario runs per configuration")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake upstream seconds to the first token")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--output-tokens", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--model-latency", action="append", metavar="MODEL=FACTOR",
+                        default=None, help="scale the fake latency for one model (repeatable)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the results as a JSON baseline to this path")
+    parser.add_argument("--compare", help="baseline JSON to check the results against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    model_latency = parse_model_latency(args.model_latency or ["gemini-2.5-flash=1.6"])
+    upstream_options = dict(
+        latency=args.latency, distribution=args.distribution, jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second, output_tokens=args.output_tokens, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, model_latency=model_latency, seed=args.seed
+    )
+
+    upstream_port = free_port()
+    upstream = serve(upstream_port, **upstream_options)
+    results = []
+    try:
+        for workers in [int(value) for value in args.workers.split(",")]:
+            for model in args.models.split(","):
+                port = free_port()
+                with tempfile.TemporaryDirectory() as data_dir:
+                    process = start_gunicorn(
+                        args.worker_class, workers, port, f"http://127.0.0.1:{upstream_port}/v1beta", data_dir,
+                        extra_env={"GEMINI_DEFAULT_MODEL": model, "LOG_LEVEL": "WARNING"}
+                    )
+                    try:
+                        for scenario in scenarios:
+                            with peak_tree_rss(process.pid) as rss:
+                                row = run_scenario(f"http://127.0.0.1:{port}", scenario, args.iterations,
+                                                   args.concurrency)
+                            row.update(scenario=scenario, workers=workers, model=model, peak_rss_mb=round(rss.peak / MB, 1))
+                            results.append(row)
+                            print(f"{scenario:<26} workers={workers} model={model}: {row['throughput_rps']} rps, "
+                                  f"p95 {row['p95_ms']} ms, {row['errors']} errors", flush=True)
+                    finally:
+                        process.terminate()
+                        process.wait()
+    finally:
+        upstream.shutdown()
+
+    print(f"\n{'scenario':<26} {'workers':>7} {'model':<18} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'errors':>7} {'rss MB':>8}")
+    for row in results:
+        print(f"{row['scenario']:<26} {row['workers']:>7} {row['model']:<18} {row['throughput_rps']:>8} "
+              f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['errors']:>7} {row['peak_rss_mb']:>8}")
+    print(f"\nFake upstream: {upstream.stats}")
+
+    baseline = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "worker_class": args.worker_class,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "upstream": upstream_options
+        },
+        "results": results
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(baseline, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for row, reasons in regressions:
+            print(f"REGRESSION {row['scenario']} workers={row['workers']} model={row['model']}: {'; '.join(reasons)}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
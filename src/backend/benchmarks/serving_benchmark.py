@@ -0,0 +1,129 @@
+"""Side-by-side benchmark of the sync and gevent gunicorn deployments.
+
+Starts a fake Gemini upstream, then for each worker class boots gunicorn
+against it and fires concurrent /texttool/new-email requests. Run from
+src/backend:
+
+    python benchmarks/serving_benchmark.py --requests 200 --concurrency 100 --latency 0.5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_gemini import serve
+from harness import BACKEND_DIR, free_port, percentile, process_tree_rss_mb
+
+
+def email_payload(i):
+    # A distinct body per request so single-flight and the response cache don't collapse them
+    return {
+        "language": "English", "tone": "Formal", "length": "Medium", "closingConnotation": "Regards",
+        "signatory": "Board", "subject": f"Benchmark {i}", "connotation": "Dear Sir",
+        "inputDetails": f"Request number {i}", "otherPoints": "None"
+    }
+
+
+def start_gunicorn(worker_class, workers, port, upstream, data_dir, extra_env=None):
+    env = dict(
+        os.environ,
+        GEMINI_API_BASE=upstream,
+        GEMINI_API_KEY="benchmark",
+        GEMINI_POOL_SIZE="1000" if worker_class == "gevent" else "10",
+        GUNICORN_WORKER_CLASS=worker_class,
+        AI4CS_DATA_DIR=data_dir,
+        RESPONSE_CACHE_ENABLED="0",
+        **(extra_env or {})
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}",
+         "--workers", str(workers), "--timeout", "600", "--backlog", "2048"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"gunicorn ({worker_class}) did not start")
+
+
+def run_load(port, total, concurrency):
+    url = f"http://127.0.0.1:{port}/texttool/new-email"
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            ok = requests.post(url, json=email_payload(i), timeout=600).status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in results]
+    return {
+        "requests": total,
+        "errors": sum(1 for _, ok in results if not ok),
+        "wall_seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake upstream seconds per call")
+    parser.add_argument("--worker-classes", default="sync,gevent")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstream = serve(upstream_port, args.latency)
+    results = []
+    try:
+        for worker_class in args.worker_classes.split(","):
+            port = free_port()
+            with tempfile.TemporaryDirectory() as data_dir:
+                process = start_gunicorn(worker_class, args.workers, port, f"http://127.0.0.1:{upstream_port}/v1beta", data_dir)
+                try:
+                    row = run_load(port, args.requests, args.concurrency)
+                    row["rss_mb"] = process_tree_rss_mb(process.pid)
+                finally:
+                    process.terminate()
+                    process.wait()
+            row.update(worker_class=worker_class, workers=args.workers, concurrency=args.concurrency,
+                       upstream_latency_s=args.latency)
+            results.append(row)
+    finally:
+        upstream.shutdown()
+
+    print(f"{'worker':<8} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'rss MB':>8}")
+    for row in results:
+        print(f"{row['worker_class']:<8} {row['throughput_rps']:>8} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+              f"{row['p99_ms']:>9} {row['errors']:>7} {row['rss_mb']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
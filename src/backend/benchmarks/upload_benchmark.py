@@ -0,0 +1,78 @@
+"""Worker memory while /texttool/extract-text receives large uploads, in memory vs spooled to disk.
+
+Builds a PDF padded with an incompressible embedded attachment (like a
+filing with scanned annexures), boots one sync gunicorn worker per mode and
+posts the file from disk. "memory" sets UPLOAD_SPOOL_BYTES above the upload
+size so it is buffered and read as bytes; "spooled" uses the default
+threshold, so the parser opens the temporary file by path. Run from src/backend:
+
+    python benchmarks/upload_benchmark.py --size-mb 40 --repeat 3
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import MB, free_port, process_tree_rss_mb, peak_tree_rss
+from serving_benchmark import start_gunicorn
+from extract_benchmark import build_pdf
+
+MODES = {
+    "memory": {"UPLOAD_SPOOL_BYTES": str(1 << 40)},
+    "spooled": {},
+}
+
+
+def build_padded_pdf(path, pages, size_mb):
+    import fitz
+    build_pdf(path, pages)
+    doc = fitz.open(path)
+    doc.embfile_add("annexure.bin", os.urandom(size_mb * 1024 * 1024))
+    doc.save(path + ".tmp")
+    doc.close()
+    os.replace(path + ".tmp", path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=40, help="size of the embedded attachment")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "filing.pdf")
+        build_padded_pdf(path, args.pages, args.size_mb)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"{args.pages}-page PDF, {size_mb:.1f} MB\n")
+
+        print(f"{'mode':<8} {'idle MB':>8} {'peak MB':>8} {'growth MB':>10} {'best s':>8}")
+        for mode, env in MODES.items():
+            port = free_port()
+            process = start_gunicorn("sync", 1, port, "http://127.0.0.1:9/v1beta", tmp, extra_env=dict(
+                env, MAX_CONTENT_LENGTH=str(int(size_mb + 64) * 1024 * 1024), LOG_LEVEL="WARNING",
+                EXTRACT_PROCESSES="1"
+            ))
+            try:
+                idle = process_tree_rss_mb(process.pid)
+                timings = []
+                with peak_tree_rss(process.pid, interval=0.01) as rss:
+                    for _ in range(args.repeat):
+                        started = time.perf_counter()
+                        with open(path, "rb") as f:
+                            response = requests.post(f"http://127.0.0.1:{port}/texttool/extract-text",
+                                                     files={"file": ("filing.pdf", f)}, timeout=600)
+                        response.raise_for_status()
+                        timings.append(time.perf_counter() - started)
+                peak = round(rss.peak / MB, 1)
+                print(f"{mode:<8} {idle:>8} {peak:>8} {peak - idle:>10.1f} {min(timings):>8.3f}")
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
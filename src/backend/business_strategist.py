@@ -1,8 +1,15 @@
 from flask import Blueprint, request, jsonify
+from generation import wants_stream, sse_event, sse_response
 from business_strategist_service import (
     create_session,
-    next_question
+    next_question,
+    stream_next_question,
+    sessions,
+    flow_stats
 )
+from session_store import SessionExpired, SessionNotFound, SessionBusy, SessionConflict
+from idempotency import idempotent
+import tracing
 
 business_strategist_bp = Blueprint("business_strategist", __name__)
 
@@ -20,6 +27,7 @@ FUNCTION_TYPES = {
 }
 
 @business_strategist_bp.route("/consultation", methods=["POST", "OPTIONS"])
+@idempotent
 def consultation():
     """Main consultation endpoint supporting all 9 strategy functions"""
     
@@ -36,11 +44,13 @@ def consultation():
             
             if not function_type or function_type not in FUNCTION_TYPES:
                 return jsonify({"error": "Invalid or missing function_type"}), 400
+            tracing.mark("validate")
             
             session_id, first_q = create_session(function_type)
             return jsonify({
                 "session_id": session_id,
                 "question": first_q,
+                "question_count": 1,
                 "function_type": function_type,
                 "function_name": FUNCTION_TYPES[function_type]
             })
@@ -51,9 +61,49 @@ def consultation():
 
             if not session_id or not answer:
                 return jsonify({"error": "Invalid request. Session ID and answer required."}), 400
+            # The question_count returned with the question being answered; lets a
+            # resubmitted answer be told apart from the same answer given again
+            question_count = data.get("question_count")
+            if question_count is not None and (type(question_count) is not int or question_count < 1):
+                return jsonify({"error": "question_count must be a positive integer"}), 400
+            tracing.mark("validate")
 
-            q = next_question(session_id, answer)
-            return jsonify({"question": q})
+            # Streaming variant: the reply is forwarded as SSE `token` events while it is generated
+            stream = data.get("stream") is True or wants_stream()
+
+            try:
+                if stream:
+                    chunks, question_count = stream_next_question(session_id, answer, question_count)
+                else:
+                    q, question_count = next_question(session_id, answer, question_count)
+            except SessionExpired as e:
+                return jsonify({
+                    "error": "Your consultation session has expired. Please start a new consultation.",
+                    "code": "session_expired",
+                    "reason": e.reason
+                }), 410
+            except SessionNotFound:
+                return jsonify({
+                    "error": "Session not found. Please start a new consultation.",
+                    "code": "session_not_found"
+                }), 404
+            except SessionBusy:
+                return jsonify({
+                    "error": "Your previous answer is still being processed. Please wait for the reply before answering again.",
+                    "code": "session_busy"
+                }), 409
+            except SessionConflict:
+                return jsonify({
+                    "error": "This consultation was updated by another request. Please reload it and try again.",
+                    "code": "session_conflict"
+                }), 409
+
+            if stream:
+                response = sse_response(consultation_events(session_id, chunks, question_count))
+                # Ends the turn and releases the session lease even if the body is never read
+                response.call_on_close(chunks.close)
+                return response
+            return jsonify({"question": q, "question_count": question_count})
         
         else:
             return jsonify({"error": "Invalid type. Use 'start' or 'next'."}), 400
@@ -61,6 +111,15 @@ def consultation():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def consultation_events(session_id, chunks, question_count):
+    try:
+        for text in chunks:
+            yield sse_event("token", {"text": text})
+    except Exception as e:
+        yield sse_event("error", {"error": str(e)})
+        return
+    yield sse_event("done", {"session_id": session_id, "question_count": question_count})
+
 @business_strategist_bp.route("/functions", methods=["GET", "OPTIONS"])
 def get_functions():
     """Get list of all available strategy functions"""
@@ -77,3 +136,10 @@ def get_functions():
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+@business_strategist_bp.route("/sessions/stats", methods=["GET"])
+def session_stats():
+    """Session store occupancy and eviction counters, plus upstream calls saved by the local intake flow (per worker)"""
+    stats = sessions.stats()
+    stats.update(flow_stats)
+    return jsonify(stats)
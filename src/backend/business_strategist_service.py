@@ -1,15 +1,21 @@
-from google import genai
-import uuid
 import os
+import re
+import uuid
+import logging
+import threading
 from dotenv import load_dotenv
+from gemini_client import GeminiAPIError, generate_text, open_stream, iter_stream, response_text
+from session_store import create_session_store, SessionExpired, SessionConflict
+import history
+import tracing
 
 load_dotenv()
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+log = logging.getLogger(__name__)
 
-client = genai.Client(api_key=GEMINI_API_KEY)
+STRATEGIST_MODEL = "gemini-2.5-flash"
 
-SESSIONS = {}
+sessions = create_session_store()
 
 # 9 Specialized Function Prompts
 FUNCTION_PROMPTS = {
@@ -304,106 +310,351 @@ Rules:
 """
 }
 
+START_INSTRUCTION = "Start the consultation by asking the first question from the information collection process."
+
+SYSTEM_ACKNOWLEDGEMENT = "I understand. I am ready to assist you with this strategic function."
+
+# Sent once, with the latest answer only; earlier answers go on the wire as plain "User's answer" turns
+NEXT_INSTRUCTION = """Based on the conversation so far and the information collection process defined in your role:
+- If you still need more information, ask the next relevant question (ONLY ONE at a time)
+- If you have collected sufficient information (typically after 4-6 questions), summarize what you understood and ask for confirmation
+- If the user confirms, provide the complete strategic output following the FINAL OUTPUT STRUCTURE defined in your role
+- If the user wants clarification or additional formats, provide that
+
+Remember:
+- Ask ONLY ONE question at a time
+- Do not give feedback on answers unless providing final output
+- Follow the output structure defined in your role
+- Be concise and professional
+"""
+
+# Sent with the answer that completes the intake questions
+CONFIRM_INSTRUCTION = """All questions in the information collection process have now been answered.
+Summarize what you understood from the answers in a few concise points and ask the user to confirm it before you prepare the final output.
+Do not ask any further questions and do not produce the final output yet.
+"""
+
+# Sent with an answer that is really a question back to the consultant
+CLARIFY_INSTRUCTION = """The user has asked for clarification instead of answering.
+Briefly clarify what you are asking and then ask the same question again. Ask ONLY ONE question.
+"""
+
+INSTRUCTIONS = {
+    "next": NEXT_INSTRUCTION,
+    "confirm": CONFIRM_INSTRUCTION,
+    "clarify": CLARIFY_INSTRUCTION
+}
+
+_INTAKE_BLOCK = re.compile(r"INFORMATION COLLECTION PROCESS[^\n]*\n(.*?)(?:\n\s*\n|$)", re.S)
+_INTAKE_ITEM = re.compile(r"^\s*\d+\)\s*(.+?)\s*$", re.M)
+
+
+def parse_intake_questions(system_prompt):
+    """The numbered questions listed under INFORMATION COLLECTION PROCESS in a function prompt"""
+    block = _INTAKE_BLOCK.search(system_prompt)
+    if not block:
+        return []
+    return _INTAKE_ITEM.findall(block.group(1))
+
+
+# Intake questions are served locally; the model is only called for clarification,
+# the confirmation summary and the final output
+INTAKE_QUESTIONS = {
+    function_type: parse_intake_questions(prompt)
+    for function_type, prompt in FUNCTION_PROMPTS.items()
+}
+
+_flow_lock = threading.Lock()
+flow_stats = {"local_questions": 0, "upstream_calls": 0}
+
+
+def _count_flow(name):
+    with _flow_lock:
+        flow_stats[name] += 1
+
+
+def needs_clarification(answer):
+    return answer.strip().endswith("?")
+
+
+def turn_text(turn, latest):
+    """Wire text for one stored turn record"""
+    if turn["kind"] == "start":
+        return START_INSTRUCTION
+    if turn["kind"] == "answer":
+        text = f"User's answer:\n{turn['text']}"
+        if not latest:
+            return text
+        return f"{text}\n\n{INSTRUCTIONS[turn.get('instruction', 'next')]}"
+    return turn["text"]
+
+
+def wire_contents(session):
+    """Render a session's compact turn records into the contents list sent to Gemini"""
+    contents = [
+        {"role": "user", "parts": [{"text": FUNCTION_PROMPTS[session["function_type"]]}]},
+        {"role": "model", "parts": [{"text": SYSTEM_ACKNOWLEDGEMENT}]}
+    ]
+    contents += history.summary_messages(session)
+
+    turns = session["turns"]
+    for index, turn in enumerate(turns):
+        contents.append({"role": turn["role"], "parts": [{"text": turn_text(turn, index == len(turns) - 1)}]})
+    return contents
+
+
+def log_turn_tokens(session_id, turn, usage, estimated_before=None, estimated_after=None):
+    """One line per upstream turn so history compaction savings can be checked in the logs"""
+    log.info("strategist tokens", extra=tracing.fields(
+        session_id=session_id,
+        turn=turn,
+        prompt_tokens=usage.get("promptTokenCount"),
+        output_tokens=usage.get("candidatesTokenCount"),
+        estimated_history_tokens_before=estimated_before,
+        estimated_history_tokens_after=estimated_after
+    ))
+
 def create_session(function_type):
     """Create a new session for a specific strategy function"""
-    print("\n" + "="*50)
-    print(f" CREATING NEW SESSION FOR: {function_type}")
-    print("="*50)
-    
     session_id = str(uuid.uuid4())
-    print(f"Generated Session ID: {session_id}")
 
     if function_type not in FUNCTION_PROMPTS:
         raise ValueError(f"Invalid function type: {function_type}")
 
-    system_prompt = FUNCTION_PROMPTS[function_type]
-    
-    chat_history = [
-        {"role": "user", "parts": [{"text": system_prompt}]},
-        {"role": "model", "parts": [{"text": "I understand. I am ready to assist you with this strategic function."}]}
-    ]
-
-    print(f"\n System Prompt Initialized for {function_type}")
+    # Sessions keep compact turn records; prompts and instructions are added by wire_contents()
+    session = {
+        "function_type": function_type,
+        "question_count": 1,
+        "phase": "intake" if INTAKE_QUESTIONS[function_type] else "open",
+        "slots": [],
+        "upstream_calls": 0,
+        "calls_saved": 0,
+        "turns": [{"role": "user", "kind": "start", "text": ""}]
+    }
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=chat_history + [{"role": "user", "parts": [{"text": "Start the consultation by asking the first question from the information collection process."}]}]
-    )
+    tracing.mark("prompt")
 
-    first_question = response.text.strip()
-    print(f"\n First Question Generated:\n{first_question}")
+    if session["phase"] == "intake":
+        first_question = INTAKE_QUESTIONS[function_type][0]
+        session["calls_saved"] += 1
+        _count_flow("local_questions")
+    else:
+        first_question, usage = generate_text(wire_contents(session), model=STRATEGIST_MODEL)
+        first_question = first_question.strip()
+        session["upstream_calls"] += 1
+        _count_flow("upstream_calls")
+        log_turn_tokens(session_id, 1, usage)
 
-    chat_history.append({"role": "user", "parts": [{"text": "Start the consultation by asking the first question from the information collection process."}]})
-    chat_history.append({"role": "model", "parts": [{"text": first_question}]})
+    session["turns"].append({"role": "model", "kind": "reply", "text": first_question})
+    sessions.save(session_id, session)
 
-    SESSIONS[session_id] = {
-        "chat_history": chat_history,
-        "answers": [],
-        "function_type": function_type,
-        "question_count": 1
-    }
-    
-    print(f"\n Session stored with {len(chat_history)} messages in history")
-    print("="*50 + "\n")
+    log.info("strategist session created", extra=tracing.fields(
+        session_id=session_id, function_type=function_type, question=tracing.payload(first_question)
+    ))
 
     return session_id, first_question
 
-def next_question(session_id, answer):
-    """Process user answer and generate next question or final output"""
-    print("\n" + "="*50)
-    print(" PROCESSING NEXT QUESTION")
-    print("="*50)
-    print(f"Session ID: {session_id}")
-    print(f"User Answer: {answer}")
-    
-    if session_id not in SESSIONS:
-        print(" Session not found!")
-        return "Session expired or invalid. Please restart the consultation."
-
-    session = SESSIONS[session_id]
-    session["answers"].append(answer)
+def next_question(session_id, answer, question_count=None):
+    """Process user answer and generate next question or final output.
+
+    Returns (reply, question_count). Only one turn per session runs at a
+    time: an overlapping call raises SessionBusy. `question_count` is the
+    count the client was given with the question it is answering; a resubmit
+    of the answer that was just processed (one turn behind) gets the stored
+    reply back instead of being recorded twice, and any other mismatch raises
+    SessionConflict.
+    """
+    # Raises SessionBusy while another turn for this session is in progress
+    sessions.acquire(session_id)
+    try:
+        session, answer_turn, local_reply = _begin_turn(session_id, answer, question_count)
+        if answer_turn is None:
+            return local_reply, session["question_count"]
+        if local_reply is not None:
+            return _store_reply(session_id, session, local_reply), session["question_count"]
+
+        contents, estimates = _upstream_contents(session)
+        try:
+            next_q, usage = generate_text(contents, model=STRATEGIST_MODEL)
+        except Exception:
+            # Leave the stored conversation as it was so the answer can be resent
+            _rollback_turn(session, answer_turn)
+            raise
+
+        reply = _finish_upstream_turn(session_id, session, answer_turn, next_q.strip(), usage, estimates)
+        return reply, session["question_count"]
+    finally:
+        sessions.release(session_id)
+
+def stream_next_question(session_id, answer, question_count=None):
+    """Streaming variant of next_question: returns (iterator of text chunks, question_count).
+
+    The upstream stream is opened before returning, so failures to start it
+    raise GeminiAPIError as usual. The session is only updated once the
+    stream has been fully consumed; if the consumer stops early (client
+    disconnect) the upstream connection is closed and the answer is rolled back.
+    The session's turn lease is held until the stream is finished. The caller
+    must close() the iterator (e.g. in response.call_on_close): a response
+    body that is never read would otherwise keep the lease.
+    """
+    sessions.acquire(session_id)
+    try:
+        session, answer_turn, local_reply = _begin_turn(session_id, answer, question_count)
+        if answer_turn is None:
+            sessions.release(session_id)
+            return _single_chunk(local_reply), session["question_count"]
+        if local_reply is not None:
+            _store_reply(session_id, session, local_reply)
+            sessions.release(session_id)
+            return _single_chunk(local_reply), session["question_count"]
+
+        contents, estimates = _upstream_contents(session)
+        upstream, status_code = open_stream(contents, model=STRATEGIST_MODEL)
+    except BaseException:
+        sessions.release(session_id)
+        raise
+
+    if status_code != 200:
+        _rollback_turn(session, answer_turn)
+        sessions.release(session_id)
+        raise GeminiAPIError(upstream.get("details") or upstream.get("error"), status_code)
+
+    def chunks():
+        stream = iter_stream(upstream)
+        parts = []
+        usage = {}
+        completed = False
+        try:
+            # Primed below, so close() runs the cleanup even before the first chunk is read
+            yield
+            for chunk in stream:
+                text = response_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+                usage = chunk.get("usageMetadata", usage)
+            completed = bool(parts)
+        finally:
+            stream.close()
+            try:
+                if completed:
+                    _finish_upstream_turn(session_id, session, answer_turn, "".join(parts).strip(), usage, estimates)
+                else:
+                    log.info("strategist stream ended early; answer not stored",
+                             extra=tracing.fields(session_id=session_id))
+                    _rollback_turn(session, answer_turn)
+            finally:
+                sessions.release(session_id)
+
+    reply = chunks()
+    next(reply)
+    return reply, session["question_count"]
+
+def _single_chunk(text):
+    yield text
+
+def _begin_turn(session_id, answer, question_count=None):
+    """Load the session and record the answer.
+
+    Returns (session, answer_turn, local_reply); local_reply is the next intake
+    question when it can be served without calling the model, else None. When
+    `question_count` shows the answer was already processed (a resubmit),
+    answer_turn is None and local_reply is the reply already stored for it.
+    """
+    # Raises SessionExpired / SessionNotFound for the blueprint to report
+    session = sessions.load(session_id)
+    if "turns" not in session:
+        # Stored by a release that kept raw chat_history; cannot be resumed
+        raise SessionExpired(session_id, "expired")
+
+    duplicate = _duplicate_reply(session_id, session, question_count)
+    if duplicate is not None:
+        log.info("duplicate strategist answer; returning the stored reply",
+                 extra=tracing.fields(session_id=session_id, question_count=question_count))
+        return session, None, duplicate
+
     session["question_count"] += 1
-    
-    chat_history = session["chat_history"]
+    turns = session["turns"]
     function_type = session["function_type"]
-    question_count = session["question_count"]
-    
-    print(f"\n Function Type: {function_type}")
-    print(f" Question Count: {question_count}")
-    print(f" Full Chat History ({len(chat_history)} messages)")
-
-    prompt = f"""
-User's answer:
-{answer}
-
-Based on the conversation so far and the information collection process defined in your role:
-- If you still need more information, ask the next relevant question (ONLY ONE at a time)
-- If you have collected sufficient information (typically after 4-6 questions), summarize what you understood and ask for confirmation
-- If the user confirms, provide the complete strategic output following the FINAL OUTPUT STRUCTURE defined in your role
-- If the user wants clarification or additional formats, provide that
-
-Remember:
-- Ask ONLY ONE question at a time
-- Do not give feedback on answers unless providing final output
-- Follow the output structure defined in your role
-- Be concise and professional
-"""
-    
-    print(f"\n Sending prompt to AI with user's answer...")
-    
-    chat_history.append({"role": "user", "parts": [{"text": prompt}]})
-    
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=chat_history
-    )
-
-    next_q = response.text.strip()
-    print(f"\n Next Response Generated:\n{next_q[:200]}...")
-    
-    chat_history.append({"role": "model", "parts": [{"text": next_q}]})
-    
-    print(f"\n Updated Chat History ({len(chat_history)} messages)")
-    print("="*50 + "\n")
-    
-    return next_q
+    log.info("strategist answer", extra=tracing.fields(
+        session_id=session_id,
+        function_type=function_type,
+        phase=session["phase"],
+        question_count=session["question_count"],
+        stored_turns=len(turns),
+        answer=tracing.payload(answer)
+    ))
+
+    answer_turn = {"role": "user", "kind": "answer", "text": answer}
+    turns.append(answer_turn)
+
+    if session["phase"] == "intake":
+        questions = INTAKE_QUESTIONS[function_type]
+        if needs_clarification(answer):
+            answer_turn["instruction"] = "clarify"
+        else:
+            session["slots"].append({"question": questions[len(session["slots"])], "answer": answer})
+            if len(session["slots"]) < len(questions):
+                next_q = questions[len(session["slots"])]
+                session["calls_saved"] += 1
+                _count_flow("local_questions")
+                log.info("strategist intake question served locally", extra=tracing.fields(session_id=session_id))
+                return session, answer_turn, next_q
+            answer_turn["instruction"] = "confirm"
+
+    return session, answer_turn, None
+
+def _duplicate_reply(session_id, session, question_count):
+    """The stored reply when the client answers a question the session has already moved past (double submit).
+
+    Without a `question_count` every answer is new; retries are then only
+    recognised through the Idempotency-Key header.
+    """
+    if question_count is None or question_count == session["question_count"]:
+        return None
+    turns = session["turns"]
+    if (question_count == session["question_count"] - 1 and len(turns) >= 2
+            and turns[-1]["role"] == "model" and turns[-2]["kind"] == "answer"):
+        return turns[-1]["text"]
+    # Answering a question from further back (or ahead): the client's view is stale
+    raise SessionConflict(session_id)
+
+def _upstream_contents(session):
+    """Compact the history to budget and render it; returns (contents, (estimated_before, estimated_after))"""
+    estimated_before = history.estimate_contents_tokens(wire_contents(session))
+    history.compact(session, history.budget_for(session["function_type"]), wire_contents)
+    contents = wire_contents(session)
+    tracing.mark("prompt")
+    return contents, (estimated_before, history.estimate_contents_tokens(contents))
+
+def _rollback_turn(session, answer_turn):
+    if answer_turn.get("instruction") == "confirm":
+        session["slots"].pop()
+    session["turns"].pop()
+    session["question_count"] -= 1
+
+def _finish_upstream_turn(session_id, session, answer_turn, reply, usage, estimates):
+    session["upstream_calls"] += 1
+    _count_flow("upstream_calls")
+    if answer_turn.get("instruction") == "confirm":
+        session["phase"] = "confirm"
+    elif session["phase"] == "confirm":
+        session["phase"] = "output"
+    log_turn_tokens(session_id, session["question_count"], usage, *estimates)
+
+    return _store_reply(session_id, session, reply)
+
+def _store_reply(session_id, session, reply):
+    session["turns"].append({"role": "model", "kind": "reply", "text": reply})
+    # Raises SessionConflict if another writer saved the session since it was loaded
+    sessions.save(session_id, session)
+
+    log.info("strategist reply stored", extra=tracing.fields(
+        session_id=session_id,
+        stored_turns=len(session["turns"]),
+        upstream_calls=session["upstream_calls"],
+        calls_saved=session["calls_saved"],
+        reply=tracing.payload(reply)
+    ))
+
+    return reply
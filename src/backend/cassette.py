@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import zlib
+import threading
+import logging
+from dotenv import load_dotenv
+from storage import connect, data_path
+import tracing
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# "record" saves the request and response of every successful Gemini call;
+# "replay" answers calls from the saved pairs without touching the network.
+# Pairs are keyed by response_cache.cache_key (model, config and prompt), so
+# a replay only needs the prompt builders to produce the same prompts.
+CASSETTE_MODE = os.getenv("GEMINI_CASSETTE", "off")
+CASSETTE_PATH = os.getenv("GEMINI_CASSETTE_PATH") or data_path("cassette.sqlite3")
+# On replay, wait this multiple of the recorded latency (0 answers immediately, 1 in recorded time)
+REPLAY_LATENCY_SCALE = float(os.getenv("GEMINI_CASSETTE_LATENCY_SCALE", "0"))
+
+RECORDING = CASSETTE_MODE == "record"
+REPLAYING = CASSETTE_MODE == "replay"
+
+GENERATE = "generateContent"
+STREAM = "streamGenerateContent"
+
+_lock = threading.Lock()
+_stats = {"recorded": 0, "replayed": 0, "misses": 0}
+_schema_ready = False
+
+
+def _db():
+    global _schema_ready
+    conn = connect(CASSETTE_PATH)
+    if not _schema_ready:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cassette ("
+            "key TEXT NOT NULL, method TEXT NOT NULL, model TEXT NOT NULL, request BLOB NOT NULL, "
+            "response BLOB NOT NULL, latency REAL NOT NULL, recorded REAL NOT NULL, PRIMARY KEY (key, method))"
+        )
+        _schema_ready = True
+    return conn
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def record(key, method, model, contents, generation_config, response, latency):
+    """Save one upstream call; a later recording of the same request replaces it"""
+    request = {"model": model, "contents": contents}
+    if generation_config is not None:
+        request["generationConfig"] = generation_config
+    try:
+        _db().execute(
+            "INSERT OR REPLACE INTO cassette (key, method, model, request, response, latency, recorded) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, method, model, _pack(request), _pack(response), latency, time.time())
+        )
+    except Exception as e:
+        log.warning("Cassette write failed: %s", e)
+        return
+    _count("recorded")
+
+
+def _lookup(key, method):
+    try:
+        row = _db().execute(
+            "SELECT response, latency FROM cassette WHERE key = ? AND method = ?", (key, method)
+        ).fetchone()
+    except Exception as e:
+        log.warning("Cassette read failed: %s", e)
+        row = None
+    if row is None:
+        _count("misses")
+        log.warning("No recorded Gemini response", extra=tracing.fields(key=key, method=method))
+        return None
+    _count("replayed")
+    return json.loads(zlib.decompress(row[0])), row[1]
+
+
+def _miss():
+    return {"error": "Gemini API failed", "details": "No recorded response for this request (cassette replay)"}, 503
+
+
+def replay_generate(key):
+    """The recorded generateContent result for `key`, as the usual (result, status_code) tuple"""
+    found = _lookup(key, GENERATE)
+    if found is None:
+        return _miss()
+    result, latency = found
+    if REPLAY_LATENCY_SCALE > 0:
+        time.sleep(latency * REPLAY_LATENCY_SCALE)
+    return result, 200
+
+
+def replay_stream(key):
+    """A stand-in for an open streamGenerateContent response that yields the recorded chunks"""
+    found = _lookup(key, STREAM)
+    if found is None:
+        return _miss()
+    return ReplayedStream(found[0]["events"]), 200
+
+
+class ReplayedStream:
+    """Enough of requests.Response for gemini_client.iter_stream"""
+
+    def __init__(self, events):
+        self.events = events
+
+    def iter_lines(self, chunk_size=None, decode_unicode=False):
+        for delay, chunk in self.events:
+            if REPLAY_LATENCY_SCALE > 0:
+                time.sleep(delay * REPLAY_LATENCY_SCALE)
+            yield "data: " + json.dumps(chunk, separators=(",", ":"), ensure_ascii=False)
+
+    def close(self):
+        pass
+
+
+class StreamRecorder:
+    """Collects the chunks of a live stream with the delay before each, and saves them once it completes"""
+
+    def __init__(self, key, model, contents, generation_config, started):
+        self.key = key
+        self.model = model
+        self.contents = contents
+        self.generation_config = generation_config
+        self.started = started
+        self.last = started
+        self.events = []
+
+    def add(self, chunk):
+        now = time.perf_counter()
+        self.events.append([round(now - self.last, 4), chunk])
+        self.last = now
+
+    def save(self):
+        record(self.key, STREAM, self.model, self.contents, self.generation_config,
+               {"events": self.events}, self.last - self.started)
+
+
+def stats():
+    """Calls recorded, replayed and missed on this worker, plus pairs stored"""
+    with _lock:
+        snapshot = dict(_stats)
+    snapshot["mode"] = CASSETTE_MODE
+    try:
+        entries, size = _db().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(request) + LENGTH(response)), 0) FROM cassette"
+        ).fetchone()
+    except Exception:
+        entries, size = 0, 0
+    snapshot["entries"] = entries
+    snapshot["bytes"] = size
+    return snapshot
@@ -0,0 +1,426 @@
+import os
+import io
+import re
+import json
+import zipfile
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from xml.etree import ElementTree
+from dotenv import load_dotenv
+import fitz  # PyMuPDF for PDFs
+
+load_dotenv()
+
+# Server-side caps on one extraction (0 = unlimited); requests may ask for less
+# with max_pages / max_chars but never for more
+EXTRACT_MAX_PAGES = int(os.getenv("EXTRACT_MAX_PAGES", "0"))
+EXTRACT_MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", "0"))
+
+# PDFs with at least EXTRACT_PARALLEL_MIN_PAGES selected pages are split into
+# chunks of EXTRACT_PARALLEL_CHUNK_PAGES and extracted by a per-worker pool of
+# EXTRACT_PROCESSES processes (1 disables parallel extraction)
+EXTRACT_PROCESSES = int(os.getenv("EXTRACT_PROCESSES", str(min(4, os.cpu_count() or 1))))
+EXTRACT_PARALLEL_MIN_PAGES = int(os.getenv("EXTRACT_PARALLEL_MIN_PAGES", "200"))
+EXTRACT_PARALLEL_CHUNK_PAGES = int(os.getenv("EXTRACT_PARALLEL_CHUNK_PAGES", "16"))
+
+# Bumped whenever extraction output changes, so cached results from older code are not served
+EXTRACTOR_VERSION = 3
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_BODY, _W_HDR, _W_FTR = _W + "body", _W + "hdr", _W + "ftr"
+_W_P, _W_T, _W_TAB, _W_BR, _W_CR = _W + "p", _W + "t", _W + "tab", _W + "br", _W + "cr"
+_W_TBL, _W_TR, _W_TC = _W + "tbl", _W + "tr", _W + "tc"
+_W_PPR = _W + "pPr"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_HEADER_PART = re.compile(r"word/header\d*\.xml")
+_FOOTER_PART = re.compile(r"word/footer\d*\.xml")
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class ExtractionOptionsError(ValueError):
+    """Raised for malformed extraction options (the client's fault, so a 400)"""
+
+
+def _cap(requested, server_max):
+    if requested and server_max:
+        return min(requested, server_max)
+    return requested or server_max
+
+
+def parse_options(values):
+    """Extraction options from request values: pages, max_pages, max_chars"""
+    options = {"pages": parse_page_ranges(values.get("pages"))}
+    for name, server_max in (("max_pages", EXTRACT_MAX_PAGES), ("max_chars", EXTRACT_MAX_CHARS)):
+        raw = values.get(name) or "0"
+        try:
+            requested = int(raw)
+        except ValueError:
+            raise ExtractionOptionsError(f"{name} must be an integer")
+        if requested < 0:
+            raise ExtractionOptionsError(f"{name} must not be negative")
+        options[name] = _cap(requested, server_max)
+    return options
+
+
+def parse_page_ranges(spec):
+    """1-based (first, last) ranges from a spec like "1-3,7,10-"; last is None for "to the end".
+
+    Returns None (all pages) for an empty spec.
+    """
+    if not spec or not spec.strip():
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, dash, end = part.partition("-")
+        try:
+            first = int(start) if start.strip() else 1
+            last = (int(end) if end.strip() else None) if dash else first
+        except ValueError:
+            raise ExtractionOptionsError(f"Invalid page range: {part}")
+        if first < 1 or (last is not None and last < first):
+            raise ExtractionOptionsError(f"Invalid page range: {part}")
+        ranges.append((first, last))
+    return ranges
+
+
+def select_pages(ranges, page_count):
+    """0-based page indices covered by `ranges`, ascending and without duplicates"""
+    if ranges is None:
+        return range(page_count)
+    selected = set()
+    for first, last in ranges:
+        selected.update(range(first - 1, min(last or page_count, page_count)))
+    return sorted(selected)
+
+
+def open_pdf(source):
+    """Open a PDF from a file path (read on demand by MuPDF) or from bytes"""
+    if isinstance(source, str):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def pdf_pages(doc, source, pages=None, max_pages=0):
+    """(page_number, text) for the selected pages, in order; large selections are extracted in parallel"""
+    indices = select_pages(pages, doc.page_count)
+    if max_pages:
+        # Pages past the limit are never needed, so don't hand them to the pool
+        # (one extra tells PageLimit whether anything was cut)
+        indices = indices[:max_pages + 1]
+    if EXTRACT_PROCESSES > 1 and len(indices) >= EXTRACT_PARALLEL_MIN_PAGES:
+        return _parallel_pages(source, indices)
+    return ((index + 1, doc.load_page(index).get_text()) for index in indices)
+
+
+def _process_pool():
+    # Created lazily (and once per process) so it survives gunicorn forking workers;
+    # "spawn" because forking a worker that has threads running is unsafe
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(EXTRACT_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def shutdown_pool():
+    """Stop this process's extraction pool, if it started one"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = (_pool if _pool_pid == os.getpid() else None), None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def _extract_page_chunk(path, indices):
+    """Runs in a pool process: text of the given 0-based pages of the PDF at `path`"""
+    with fitz.open(path) as doc:
+        return [doc.load_page(index).get_text() for index in indices]
+
+
+def _parallel_pages(source, indices):
+    # Pool processes reopen the document from disk instead of each receiving
+    # the bytes; chunks are yielded in page order as they finish
+    if isinstance(source, str):
+        yield from _pooled_pages(source, indices)
+        return
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+        f.write(source)
+        f.flush()
+        yield from _pooled_pages(f.name, indices)
+
+
+def _pooled_pages(path, indices):
+    chunks = [indices[i:i + EXTRACT_PARALLEL_CHUNK_PAGES] for i in range(0, len(indices), EXTRACT_PARALLEL_CHUNK_PAGES)]
+    pool = _process_pool()
+    futures = [pool.submit(_extract_page_chunk, path, chunk) for chunk in chunks]
+    try:
+        for chunk, future in zip(chunks, futures):
+            for index, text in zip(chunk, future.result()):
+                yield index + 1, text
+    except BrokenProcessPool:
+        # A pool process died (e.g. killed for memory); start a fresh pool next time
+        _reset_pool()
+        raise
+    finally:
+        # Early exit (a limit was hit or the client went away): drop chunks not yet started
+        for future in futures:
+            future.cancel()
+
+
+class PageLimit:
+    """Passes (page_number, text) through until max_pages or max_chars is reached.
+
+    Stops pulling from `pages` as soon as a limit is hit, so the remaining
+    pages are never extracted; the page that crosses max_chars is cut to fit.
+    `truncated` tells whether anything was left out.
+    """
+
+    def __init__(self, pages, max_pages=0, max_chars=0):
+        self.pages = pages
+        self.max_pages = max_pages
+        self.max_chars = max_chars
+        self.count = 0
+        self.chars = 0
+        self.truncated = False
+
+    def __iter__(self):
+        for number, text in self.pages:
+            if (self.max_pages and self.count >= self.max_pages) or (self.max_chars and self.chars >= self.max_chars):
+                self.truncated = True
+                break
+            if self.max_chars and self.chars + len(text) > self.max_chars:
+                text = text[:self.max_chars - self.chars]
+                self.truncated = True
+            self.count += 1
+            self.chars += len(text)
+            yield number, text
+            if self.truncated:
+                break
+        if self.truncated and hasattr(self.pages, "close"):
+            # Release what the source holds (pool chunks, temporary file) now rather than on collection
+            self.pages.close()
+
+
+def extract_pdf(source, pages=None, max_pages=0, max_chars=0):
+    """Text of the selected PDF pages, collected per page and joined once (`source` is a path or bytes)"""
+    with open_pdf(source) as doc:
+        limited = PageLimit(pdf_pages(doc, source, pages, max_pages), max_pages, max_chars)
+        texts = [text for _, text in limited]
+        return {
+            "text": "".join(texts),
+            "pageCount": doc.page_count,
+            "pagesExtracted": limited.count,
+            "truncated": limited.truncated
+        }
+
+
+def stream_pdf(source, pages=None, max_pages=0, max_chars=0, summary=None):
+    """NDJSON lines: one {"page", "text"} object per page, then a {"done": true, ...} summary.
+
+    `summary` adds fields to the last line. The document is opened before
+    this returns, so a broken upload fails here rather than after the
+    response has started.
+    """
+    return _pdf_lines(open_pdf(source), source, pages, max_pages, max_chars, summary or {})
+
+
+def _pdf_lines(doc, source, pages, max_pages, max_chars, summary):
+    with doc:
+        limited = PageLimit(pdf_pages(doc, source, pages, max_pages), max_pages, max_chars)
+        try:
+            for number, text in limited:
+                yield ndjson_line({"page": number, "text": text})
+        except Exception as e:
+            yield ndjson_line({"error": f"Failed to process file: {str(e)}"})
+            return
+        yield ndjson_line({
+            "done": True,
+            "pageCount": doc.page_count,
+            "pagesExtracted": limited.count,
+            "chars": limited.chars,
+            "truncated": limited.truncated,
+            **summary
+        })
+
+
+def ndjson_line(value):
+    return json.dumps(value, ensure_ascii=False) + "\n"
+
+
+def extract_docx(source, max_chars=0):
+    """Text of a DOCX: headers, then body paragraphs and table rows in document order, then footers"""
+    texts = []
+    chars = 0
+    truncated = False
+    for block in iter_docx_blocks(source):
+        # Joined with newlines, so each earlier block costs one more character
+        remaining = max_chars - chars - len(texts)
+        if max_chars and len(block) > remaining:
+            if remaining > 0:
+                texts.append(block[:remaining])
+            truncated = True
+            break
+        texts.append(block)
+        chars += len(block)
+    return {"text": "\n".join(texts), "truncated": truncated}
+
+
+def iter_docx_blocks(source):
+    """Yield the paragraphs and table rows of a DOCX (path or bytes) without building its object model.
+
+    The XML parts are parsed incrementally straight from the zip. Table rows
+    come out as their cells joined by tabs, each cell's paragraphs joined by
+    newlines; nested tables are folded into the enclosing cell. Header and
+    footer text repeated across sections is emitted once.
+    """
+    with zipfile.ZipFile(source if isinstance(source, str) else io.BytesIO(source)) as archive:
+        names = set(archive.namelist())
+        headers = sorted((name for name in names if _HEADER_PART.fullmatch(name)), key=_part_number)
+        footers = sorted((name for name in names if _FOOTER_PART.fullmatch(name)), key=_part_number)
+
+        yield from _unique_parts(archive, headers)
+        with archive.open("word/document.xml") as part:
+            yield from _iter_wordml_blocks(part)
+        yield from _unique_parts(archive, footers)
+
+
+def _part_number(name):
+    digits = re.sub(r"\D", "", name)
+    return int(digits) if digits else 0
+
+
+def _unique_parts(archive, names):
+    seen = set()
+    for name in names:
+        with archive.open(name) as part:
+            blocks = list(_iter_wordml_blocks(part))
+        key = tuple(blocks)
+        if not any(blocks) or key in seen:
+            continue
+        seen.add(key)
+        yield from blocks
+
+
+def _iter_wordml_blocks(part):
+    # Stacks, innermost last: the runs of open paragraphs (text boxes can
+    # nest a paragraph inside another), the paragraphs of open table cells,
+    # and the cells of open table rows
+    runs = []
+    cells = []
+    rows = []
+    container = None
+    fallback = 0
+    properties = 0
+    for event, elem in ElementTree.iterparse(part, events=("start", "end")):
+        tag = elem.tag
+        if tag == _MC_FALLBACK:
+            # Alternate rendering of content (e.g. a text box) already read from mc:Choice
+            fallback += 1 if event == "start" else -1
+            continue
+        if tag == _W_PPR:
+            # Paragraph properties hold no text, but their tab stop definitions are w:tab too
+            properties += 1 if event == "start" else -1
+            continue
+        if fallback or properties:
+            continue
+        if event == "start":
+            if tag == _W_P:
+                runs.append([])
+            elif tag == _W_TC:
+                cells.append([])
+            elif tag == _W_TR:
+                rows.append([])
+            elif tag in (_W_BODY, _W_HDR, _W_FTR):
+                container = elem
+            continue
+
+        if tag == _W_T and runs:
+            runs[-1].append(elem.text or "")
+        elif tag == _W_TAB and runs:
+            runs[-1].append("\t")
+        elif tag in (_W_BR, _W_CR) and runs:
+            runs[-1].append("\n")
+        elif tag == _W_P:
+            text = "".join(runs.pop())
+            if runs:
+                runs[-1].append(text)
+            elif cells:
+                cells[-1].append(text)
+            else:
+                yield text
+        elif tag == _W_TC:
+            text = "\n".join(cells.pop())
+            if rows:
+                rows[-1].append(text)
+        elif tag == _W_TR:
+            line = "\t".join(rows.pop())
+            if cells:
+                cells[-1].append(line)
+            else:
+                yield line
+
+        if container is not None and not runs and not cells and not rows and tag in (_W_P, _W_TBL):
+            # A top-level block is done: drop it (and everything before it) from the tree
+            container.clear()
+
+
+def extract_txt(source, max_chars=0):
+    if isinstance(source, str):
+        with open(source, encoding='utf-8') as f:
+            return _truncated_text(f.read(max_chars + 1) if max_chars else f.read(), max_chars)
+    return _truncated_text(source.decode('utf-8'), max_chars)
+
+
+def _truncated_text(text, max_chars):
+    if max_chars and len(text) > max_chars:
+        return {"text": text[:max_chars], "truncated": True}
+    return {"text": text, "truncated": False}
+
+
+# Extractor for each supported file extension
+EXTRACTORS = {
+    "pdf": lambda source, options: extract_pdf(source, **options),
+    "docx": lambda source, options: extract_docx(source, options["max_chars"]),
+    "txt": lambda source, options: extract_txt(source, options["max_chars"]),
+}
+
+
+def file_format(filename):
+    """Lower-case extension of `filename`, or None if it is not a supported format"""
+    extension = filename.lower().rsplit('.', 1)[-1]
+    return extension if extension in EXTRACTORS else None
+
+
+def extract_file(source, file_format, options):
+    return EXTRACTORS[file_format](source, options)
+
+
+def submit_file(source, file_format, options):
+    """Extract a whole file on the process pool; returns a Future of the extract_file result"""
+    return _process_pool().submit(_extract_file_in_pool, source, file_format, options)
+
+
+def _extract_file_in_pool(source, file_format, options):
+    # Runs in a pool process: the pool is already the parallelism, so don't
+    # let a large PDF start a pool of its own
+    global EXTRACT_PROCESSES
+    EXTRACT_PROCESSES = 1
+    return extract_file(source, file_format, options)
+
@@ -0,0 +1,179 @@
+import os
+import io
+import time
+import zipfile
+import posixpath
+import logging
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+import tracing
+import metrics
+import uploads
+import extraction
+import extraction_cache
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# Most files one batch (uploads plus ZIP members) may contain
+EXTRACT_BATCH_MAX_FILES = int(os.getenv("EXTRACT_BATCH_MAX_FILES", "50"))
+# Most bytes the members of uploaded ZIPs may expand to, all archives together
+EXTRACT_BATCH_MAX_UNZIPPED_BYTES = int(
+    os.getenv("EXTRACT_BATCH_MAX_UNZIPPED_BYTES", str(4 * uploads.MAX_CONTENT_LENGTH))
+)
+
+_COPY_CHUNK = 1024 * 1024
+
+
+class BatchError(ValueError):
+    """Raised for a batch that cannot be accepted (too many files, a bad or oversized ZIP)"""
+
+
+class BatchFile:
+    """One file of a batch: its name, where to read it from and its format (None when unsupported)"""
+
+    def __init__(self, filename, source):
+        self.filename = filename
+        self.source = source
+        self.format = extraction.file_format(filename)
+        self.size = uploads.source_size(source)
+
+
+def expand_uploads(files, directory):
+    """BatchFiles for the uploaded files, with any .zip replaced by its members (written under `directory`).
+
+    Spooled uploads are linked into `directory` too: the request deletes its
+    temporary files when the view returns, long before the stream reads them.
+    """
+    batch = []
+    unzipped = 0
+    for file in files:
+        if not file.filename:
+            continue
+        source = uploads.upload_source(file)
+        if file.filename.lower().endswith(".zip"):
+            unzipped += _expand_zip(file.filename, source, directory, batch, EXTRACT_BATCH_MAX_UNZIPPED_BYTES - unzipped)
+        else:
+            batch.append(BatchFile(file.filename, uploads.keep_upload(source, directory, f"{len(batch)}-upload")))
+        if len(batch) > EXTRACT_BATCH_MAX_FILES:
+            raise BatchError(f"Too many files in one batch (limit {EXTRACT_BATCH_MAX_FILES})")
+    return batch
+
+
+def _expand_zip(archive_name, source, directory, batch, budget):
+    # Members are copied out in chunks and counted as they are written, so an
+    # archive whose headers understate its sizes still cannot fill the disk
+    written = 0
+    try:
+        with zipfile.ZipFile(source if isinstance(source, str) else io.BytesIO(source)) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                base = posixpath.basename(name)
+                if info.is_dir() or not base or base.startswith(".") or name.startswith("__MACOSX/"):
+                    continue
+                if len(batch) >= EXTRACT_BATCH_MAX_FILES:
+                    raise BatchError(f"Too many files in one batch (limit {EXTRACT_BATCH_MAX_FILES})")
+                path = os.path.join(directory, f"{len(batch)}-{base}")
+                with archive.open(info) as member, open(path, "wb") as out:
+                    for chunk in iter(lambda: member.read(_COPY_CHUNK), b""):
+                        written += len(chunk)
+                        if written > budget:
+                            raise BatchError(f"{archive_name} expands to more than the batch allows")
+                        out.write(chunk)
+                batch.append(BatchFile(f"{archive_name}/{name}", path))
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, RuntimeError, NotImplementedError) as e:
+        # RuntimeError: encrypted member; NotImplementedError: unsupported compression
+        raise BatchError(f"Could not read {archive_name}: {str(e)}")
+    return written
+
+
+def iter_batch(batch, options, cache_options):
+    """NDJSON lines: one result per file in the order they finish, then a {"done": true, ...} summary.
+
+    Cached files are answered first; the rest are extracted concurrently on
+    the extraction pool (one process per file, at most EXTRACT_PROCESSES at
+    a time), or one after another when the pool is disabled. A file that
+    fails only fails its own line.
+    """
+    started = time.perf_counter()
+    counts = {"files": len(batch), "succeeded": 0, "failed": 0, "cached": 0}
+    for line in _batch_results(batch, options, cache_options, counts):
+        yield extraction.ndjson_line(line)
+    wall_ms = round((time.perf_counter() - started) * 1000, 1)
+    log.info("extracted batch", extra=tracing.fields(wall_ms=wall_ms, **counts))
+    yield extraction.ndjson_line({"done": True, "wallMs": wall_ms, **counts})
+
+
+def _batch_results(batch, options, cache_options, counts):
+    pending = []
+    for index, item in enumerate(batch):
+        metrics.observe("ai4cs_upload_bytes", (item.format or "other",), item.size)
+        if item.format is None:
+            yield _failed(index, item, "Unsupported file format", counts)
+            continue
+        try:
+            digest = extraction_cache.content_hash(item.source)
+        except Exception as e:
+            yield _failed(index, item, f"Failed to process file: {str(e)}", counts)
+            continue
+        result = extraction_cache.get(digest, cache_options)
+        if result is not None:
+            counts["cached"] += 1
+            yield _succeeded(index, item, digest, result, True, counts)
+        else:
+            pending.append((index, item, digest))
+
+    if extraction.EXTRACT_PROCESSES <= 1:
+        for index, item, digest in pending:
+            try:
+                result = extraction.extract_file(item.source, item.format, options)
+            except Exception as e:
+                yield _failed(index, item, f"Failed to process file: {str(e)}", counts)
+                continue
+            extraction_cache.put(digest, cache_options, result)
+            yield _succeeded(index, item, digest, result, False, counts)
+        return
+
+    futures = {extraction.submit_file(item.source, item.format, options): (index, item, digest)
+               for index, item, digest in pending}
+    try:
+        for future in as_completed(futures):
+            index, item, digest = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # A pool process died (e.g. killed for memory); start a fresh pool next time
+                extraction._reset_pool()
+                yield _failed(index, item, "Failed to process file: extraction process died", counts)
+                continue
+            except Exception as e:
+                yield _failed(index, item, f"Failed to process file: {str(e)}", counts)
+                continue
+            extraction_cache.put(digest, cache_options, result)
+            yield _succeeded(index, item, digest, result, False, counts)
+    finally:
+        # The client went away: drop files not yet started
+        for future in futures:
+            future.cancel()
+
+
+def _succeeded(index, item, digest, result, cached, counts):
+    counts["succeeded"] += 1
+    result = dict(result)
+    return {
+        "index": index,
+        "filename": item.filename,
+        "status": "success",
+        "extractedText": result.pop("text"),
+        "contentHash": digest,
+        "cached": cached,
+        **result
+    }
+
+
+def _failed(index, item, error, counts):
+    counts["failed"] += 1
+    log.warning("batch file failed", extra=tracing.fields(filename=item.filename, error=error))
+    return {"index": index, "filename": item.filename, "status": "error", "error": error}
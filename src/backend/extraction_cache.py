@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+import logging
+from dotenv import load_dotenv
+from storage import connect, data_path, evict_lru
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# Extracted text keyed by the SHA-256 of the uploaded bytes plus the extraction
+# options, shared by every worker on the host through one SQLite file
+CACHE_ENABLED = os.getenv("EXTRACT_CACHE_ENABLED", "1") == "1"
+CACHE_TTL = int(os.getenv("EXTRACT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+DISK_MAX_BYTES = int(os.getenv("EXTRACT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+DISK_PATH = os.getenv("EXTRACT_CACHE_PATH") or data_path("extraction_cache.sqlite3")
+
+_HASH_CHUNK = 1024 * 1024
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0}
+_schema_ready = False
+
+
+def content_hash(source):
+    """Hex SHA-256 of an upload given as a file path or bytes"""
+    digest = hashlib.sha256()
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+                digest.update(chunk)
+    else:
+        digest.update(source)
+    return digest.hexdigest()
+
+
+def options_key(options):
+    """Canonical form of the extraction options that change the result"""
+    return json.dumps(options, sort_keys=True, separators=(",", ":"))
+
+
+def _db():
+    global _schema_ready
+    conn = connect(DISK_PATH)
+    if not _schema_ready:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS extraction_cache ("
+            "content_hash TEXT NOT NULL, options TEXT NOT NULL, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (content_hash, options))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS extraction_cache_accessed ON extraction_cache (accessed)")
+        _schema_ready = True
+    return conn
+
+
+def get(digest, options):
+    """The cached extraction result for a document and options, or None on a miss"""
+    if not CACHE_ENABLED:
+        return None
+    now = time.time()
+    key = options_key(options)
+    try:
+        conn = _db()
+        row = conn.execute(
+            "SELECT value FROM extraction_cache WHERE content_hash = ? AND options = ? AND created > ?",
+            (digest, key, now - CACHE_TTL)
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE extraction_cache SET accessed = ? WHERE content_hash = ? AND options = ?", (now, digest, key)
+            )
+    except Exception as e:
+        log.warning("Extraction cache read failed: %s", e)
+        row = None
+
+    with _lock:
+        _stats["hits" if row is not None else "misses"] += 1
+    if row is None:
+        return None
+    return json.loads(zlib.decompress(row[0]))
+
+
+def put(digest, options, result):
+    """Store an extraction result (the text plus its metadata)"""
+    if not CACHE_ENABLED:
+        return
+    now = time.time()
+    blob = zlib.compress(json.dumps(result, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+    try:
+        conn = _db()
+        conn.execute(
+            "INSERT OR REPLACE INTO extraction_cache (content_hash, options, value, size, created, accessed) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (digest, options_key(options), blob, len(blob), now, now)
+        )
+        evict_lru(conn, "extraction_cache", CACHE_TTL, DISK_MAX_BYTES, now)
+    except Exception as e:
+        log.warning("Extraction cache write failed: %s", e)
+        return
+
+    with _lock:
+        _stats["stores"] += 1
+
+
+def stats():
+    """Hit/miss counters for this worker plus entries and bytes stored"""
+    with _lock:
+        snapshot = dict(_stats)
+
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = round(snapshot["hits"] / lookups, 4) if lookups else 0.0
+    try:
+        entries, size = _db().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extraction_cache"
+        ).fetchone()
+    except Exception:
+        entries, size = 0, 0
+    snapshot["entries"] = entries
+    snapshot["bytes"] = size
+    return snapshot
@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+import response_cache
+import metrics
+import cassette
+import tracing
+from singleflight import SingleFlight
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Transport configuration (overridable per deployment)
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+DEFAULT_MODEL = os.getenv("GEMINI_DEFAULT_MODEL", "gemini-2.0-flash")
+POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", "120"))
+
+DEFAULT_GENERATION_CONFIG = {
+    "maxOutputTokens": 2048,
+    "temperature": 0.7
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+# Identical requests already in flight on this worker share one upstream call
+inflight = SingleFlight()
+
+
+def get_session():
+    """Return the per-worker keep-alive session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, pool_block=False)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Content-Type": "application/json"})
+                _session = session
+    return _session
+
+
+def reset_session():
+    """Drop the pooled session (e.g. after fork) so the next call opens fresh connections"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def warm_up():
+    """Open a pooled connection to the Gemini host so the first request skips DNS/TLS setup"""
+    try:
+        get_session().head(GEMINI_API_BASE, timeout=(CONNECT_TIMEOUT, CONNECT_TIMEOUT))
+        return True
+    except requests.exceptions.RequestException as e:
+        log.warning("Gemini pool warm-up failed", extra=tracing.fields(error=str(e)))
+        return False
+
+
+def model_url(model, method="generateContent"):
+    return f"{GEMINI_API_BASE}/models/{model}:{method}"
+
+
+def generate_content(contents, model=DEFAULT_MODEL, generation_config=None, cache=False):
+    """Call generateContent over the pooled session.
+
+    Returns a (result, status_code) tuple in the same shape the blueprints
+    already return to the frontend. Concurrent identical requests are
+    coalesced into one upstream call. Endpoints whose output depends only on
+    the prompt can pass cache=True to serve repeats from response_cache.
+    """
+    key = response_cache.cache_key(model, generation_config, contents)
+
+    def post():
+        # Includes waiting on an identical call already in flight
+        with tracing.phase("upstream"):
+            return inflight.do(key, lambda: _post_generate(key, contents, model, generation_config))
+
+    if cache:
+        return response_cache.get_or_generate(key, post)
+    return post()
+
+
+def _post_generate(key, contents, model, generation_config):
+    started = time.perf_counter()
+    if cassette.REPLAYING:
+        result, status_code = cassette.replay_generate(key)
+    else:
+        result, status_code = _post_generate_request(contents, model, generation_config)
+        if cassette.RECORDING and status_code == 200:
+            cassette.record(key, cassette.GENERATE, model, contents, generation_config, result,
+                            time.perf_counter() - started)
+    metrics.observe_upstream(
+        model, status_code, metrics.finish_reason(result), time.perf_counter() - started,
+        result.get("usageMetadata") if status_code == 200 else None
+    )
+    return result, status_code
+
+
+def _post_generate_request(contents, model, generation_config):
+    payload = {"contents": contents}
+    if generation_config is not None:
+        payload["generationConfig"] = generation_config
+
+    try:
+        response = get_session().post(
+            model_url(model),
+            params={"key": GEMINI_API_KEY},
+            json=payload,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+        )
+
+        if response.status_code != 200:
+            return {
+                "error": "Gemini API failed",
+                "details": response.text
+            }, response.status_code
+
+        return response.json(), 200
+
+    except requests.exceptions.Timeout:
+        return {"error": "Request timed out"}, 504
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+
+def open_stream(contents, model=DEFAULT_MODEL, generation_config=None):
+    """Start a streamGenerateContent (SSE) call.
+
+    Returns (response, 200) with the upstream body still unread, or the
+    usual (error_result, status_code) if the call could not be started.
+    """
+    started = time.perf_counter()
+    key = response_cache.cache_key(model, generation_config, contents)
+    with tracing.phase("upstream"):
+        if cassette.REPLAYING:
+            result, status_code = cassette.replay_stream(key)
+        else:
+            result, status_code = _open_stream_request(contents, model, generation_config)
+    if status_code == 200:
+        # iter_stream records the call once the stream ends
+        result.metrics_model = model
+        result.metrics_started = started
+        result.recorder = None
+        if cassette.RECORDING:
+            result.recorder = cassette.StreamRecorder(key, model, contents, generation_config, started)
+    else:
+        metrics.observe_upstream(model, status_code, None, time.perf_counter() - started, None)
+    return result, status_code
+
+
+def _open_stream_request(contents, model, generation_config):
+    payload = {"contents": contents}
+    if generation_config is not None:
+        payload["generationConfig"] = generation_config
+
+    try:
+        response = get_session().post(
+            model_url(model, "streamGenerateContent"),
+            params={"key": GEMINI_API_KEY, "alt": "sse"},
+            json=payload,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            stream=True
+        )
+
+        if response.status_code != 200:
+            details = response.text
+            response.close()
+            return {
+                "error": "Gemini API failed",
+                "details": details
+            }, response.status_code
+
+        return response, 200
+
+    except requests.exceptions.Timeout:
+        return {"error": "Request timed out"}, 504
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+
+def iter_stream(response):
+    """Yield each GenerateContentResponse chunk of an open stream; closing the generator closes the upstream connection"""
+    usage = None
+    finish = None
+    reading_started = time.perf_counter()
+    try:
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if line and line.startswith("data:"):
+                chunk = json.loads(line[5:])
+                usage = chunk.get("usageMetadata", usage)
+                finish = metrics.finish_reason(chunk) or finish
+                if response.recorder is not None:
+                    response.recorder.add(chunk)
+                yield chunk
+    finally:
+        response.close()
+        if response.recorder is not None and finish:
+            # Only complete streams are worth replaying
+            response.recorder.save()
+        tracing.add_time("upstream", time.perf_counter() - reading_started)
+        metrics.observe_upstream(
+            response.metrics_model, 200, finish or "ABORTED",
+            time.perf_counter() - response.metrics_started, usage
+        )
+
+
+def call_gemini_api(prompt, model=DEFAULT_MODEL, generation_config=None, cache=False):
+    """Helper function to call Gemini API with a single-prompt request"""
+    return generate_content(
+        prompt_contents(prompt),
+        model=model,
+        generation_config=generation_config or DEFAULT_GENERATION_CONFIG,
+        cache=cache
+    )
+
+
+def prompt_contents(prompt):
+    return [{"parts": [{"text": prompt}]}]
+
+
+def response_text(result):
+    """Concatenate the text parts of the first candidate, or '' if there are none"""
+    try:
+        parts = result["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+    return "".join(part.get("text", "") for part in parts)
+
+
+class GeminiAPIError(Exception):
+    """Raised by generate_text when the upstream call does not produce text"""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def generate_text(contents, model=DEFAULT_MODEL, generation_config=None):
+    """Call generateContent and return (text, usage_metadata), raising GeminiAPIError on failure"""
+    result, status_code = generate_content(contents, model=model, generation_config=generation_config)
+    if status_code != 200:
+        raise GeminiAPIError(result.get("details") or result.get("error"), status_code)
+
+    text = response_text(result)
+    if not text:
+        raise GeminiAPIError("No content returned", 502)
+    return text, result.get("usageMetadata", {})
@@ -0,0 +1,86 @@
+import json
+from flask import request, jsonify, Response, stream_with_context
+from jobs import wants_async, accepted_response
+import tracing
+from gemini_client import (
+    DEFAULT_MODEL,
+    DEFAULT_GENERATION_CONFIG,
+    call_gemini_api,
+    open_stream,
+    iter_stream,
+    prompt_contents,
+    response_text
+)
+
+
+def wants_stream():
+    """True when the client opted into Server-Sent Events (?stream=1 or Accept: text/event-stream)"""
+    if request.args.get("stream") == "1":
+        return True
+    return "text/event-stream" in request.headers.get("Accept", "")
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_events(chunks):
+    """Turn upstream chunks into `token` events and a final `done` event carrying usage metadata"""
+    usage = None
+    finish_reason = None
+    for chunk in chunks:
+        text = response_text(chunk)
+        if text:
+            yield sse_event("token", {"text": text})
+
+        usage = chunk.get("usageMetadata", usage)
+        candidates = chunk.get("candidates") or [{}]
+        finish_reason = candidates[0].get("finishReason", finish_reason)
+
+    yield sse_event("done", {"finishReason": finish_reason, "usageMetadata": usage})
+
+
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def stream_response(prompt, model=DEFAULT_MODEL, generation_config=None):
+    """Forward a generation to the client as SSE while Gemini produces it"""
+    upstream, status_code = open_stream(
+        prompt_contents(prompt),
+        model=model,
+        generation_config=generation_config or DEFAULT_GENERATION_CONFIG
+    )
+    if status_code != 200:
+        return jsonify(upstream), status_code
+
+    def events():
+        try:
+            yield from stream_events(iter_stream(upstream))
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+
+    return sse_response(events())
+
+
+def generation_response(prompt, cache=False):
+    """Run a single-prompt generation and build the route's response.
+
+    Returns the usual JSON body, an SSE stream when the client asked for one,
+    or a 202 with a job id when the client asked for an async job.
+    """
+    # Everything since the body was parsed went into validating it and building the prompt
+    tracing.mark("prompt")
+
+    if wants_stream():
+        return stream_response(prompt)
+
+    if wants_async():
+        return accepted_response(request.path, lambda: call_gemini_api(prompt, cache=cache))
+
+    result, status_code = call_gemini_api(prompt, cache=cache)
+    return jsonify(result), status_code
@@ -0,0 +1,32 @@
+# Gunicorn settings for the AI4CS backend.
+# Picked up automatically when gunicorn is started from this directory,
+# e.g. `gunicorn app:app`.
+import os
+
+# "sync" keeps one in-flight request per worker process. "gevent" lets each
+# process hold hundreds of in-flight generations: the views stay unchanged,
+# but the pooled requests session in gemini_client yields to other requests
+# while it waits on Gemini. Raise GEMINI_POOL_SIZE to match when using it.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+
+def post_worker_init(worker):
+    """Open the Gemini keep-alive pool once per worker, before it takes traffic"""
+    if os.getenv("GEMINI_POOL_WARMUP", "1") != "1":
+        return
+
+    import gemini_client
+    import cassette
+
+    if cassette.REPLAYING:
+        return  # Replays never reach the network
+    gemini_client.reset_session()
+    gemini_client.warm_up()
+
+
+def worker_exit(server, worker):
+    """Stop the worker's PDF extraction processes along with it"""
+    import extraction
+
+    extraction.shutdown_pool()
@@ -0,0 +1,105 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Prompt-token budget for the history sent on each strategist turn. Override
+# globally with HISTORY_TOKEN_BUDGET or per function with e.g.
+# HISTORY_TOKEN_BUDGET_MARKET_ANALYSIS.
+DEFAULT_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "6000"))
+# The most recent turns are always sent verbatim
+RECENT_MESSAGES = int(os.getenv("HISTORY_RECENT_MESSAGES", "6"))
+# Each folded turn keeps at most this many characters in the summary
+FACT_MAX_CHARS = 400
+# Share of the token budget the summary itself may use; past it the oldest
+# summary lines are merged pairwise, each keeping half its length
+SUMMARY_BUDGET_SHARE = float(os.getenv("HISTORY_SUMMARY_BUDGET_SHARE", "0.25"))
+
+
+def estimate_tokens(text):
+    # Gemini averages roughly four characters per token for English prose
+    return len(text) // 4 + 1
+
+
+def estimate_contents_tokens(contents):
+    return sum(
+        estimate_tokens(part.get("text", ""))
+        for message in contents
+        for part in message.get("parts", [])
+    )
+
+
+def budget_for(function_type):
+    return int(os.getenv(f"HISTORY_TOKEN_BUDGET_{function_type.upper()}", DEFAULT_TOKEN_BUDGET))
+
+
+def _fact(turn):
+    """Condense one turn record into a single summary line (None if it carries no information)"""
+    if turn["kind"] == "answer":
+        label = "User"
+    elif turn["role"] == "model":
+        label = "Consultant"
+    else:
+        return None
+
+    return f"{label}: {_shorten(' '.join(turn['text'].split()), FACT_MAX_CHARS)}"
+
+
+def _shorten(text, max_chars):
+    if len(text) > max_chars:
+        return text[:max_chars].rstrip() + "..."
+    return text
+
+
+def _summary_tokens(summary):
+    return sum(estimate_tokens(fact) for fact in summary)
+
+
+def _condense_summary(summary, max_tokens):
+    """Merge the two oldest summary lines into one until the summary fits `max_tokens`.
+
+    A merged line is about FACT_MAX_CHARS long at most, so every merge shrinks the
+    summary and older facts fade first. Modifies `summary` in place.
+    """
+    half = FACT_MAX_CHARS // 2
+    while len(summary) > 1 and _summary_tokens(summary) > max_tokens:
+        summary[:2] = [f"{_shorten(summary[0], half)} / {_shorten(summary[1], half)}"]
+
+
+def summary_messages(session):
+    """The rolling summary as a user/model message pair, or [] before anything was folded"""
+    summary = session.get("history_summary")
+    if not summary:
+        return []
+
+    summary_text = "Summary of the earlier conversation (older turns condensed):\n" + "\n".join(
+        f"- {fact}" for fact in summary
+    )
+    return [
+        {"role": "user", "parts": [{"text": summary_text}]},
+        {"role": "model", "parts": [{"text": "Noted. I will use this summary of our earlier discussion."}]}
+    ]
+
+
+def compact(session, budget, render):
+    """Fold the oldest user/model turn pairs into session["history_summary"] until
+    render(session) fits `budget` tokens or only RECENT_MESSAGES turns remain.
+
+    Folded turns are removed from session["turns"], and the summary is held to
+    SUMMARY_BUDGET_SHARE of `budget`, so the stored session stays bounded as
+    well. Returns the number of turns folded.
+    """
+    turns = session["turns"]
+    summary = session.setdefault("history_summary", [])
+    folded = 0
+
+    while len(turns) > RECENT_MESSAGES and estimate_contents_tokens(render(session)) > budget:
+        for turn in turns[:2]:
+            fact = _fact(turn)
+            if fact:
+                summary.append(fact)
+        del turns[:2]
+        folded += 2
+
+    _condense_summary(summary, int(budget * SUMMARY_BUDGET_SHARE))
+    return folded
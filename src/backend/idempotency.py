@@ -0,0 +1,130 @@
+import os
+import time
+import hashlib
+import logging
+from functools import wraps
+from dotenv import load_dotenv
+from flask import request, jsonify, make_response, Response
+from storage import connect, data_path
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# How long a completed response is kept for replay
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(15 * 60)))
+# How long a retry waits for an in-progress original before answering 409. Kept
+# short so a duplicate does not tie up a worker for as long as the original runs
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "2"))
+# Retry-After (seconds) sent with that 409
+IDEMPOTENCY_RETRY_AFTER = int(os.getenv("IDEMPOTENCY_RETRY_AFTER_SECONDS", "5"))
+# A pending claim older than this is assumed abandoned (worker killed) and can be taken over
+IDEMPOTENCY_PENDING_TIMEOUT = float(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", "300"))
+IDEMPOTENCY_PATH = os.getenv("IDEMPOTENCY_PATH") or data_path("idempotency.sqlite3")
+
+_POLL_INTERVAL = 0.25
+# Transient failures (including a strategist session busy with another turn)
+# are not stored, so a retry gets a fresh attempt
+_RETRYABLE_STATUSES = {408, 409, 429}
+_schema_ready = False
+
+
+def _db():
+    global _schema_ready
+    conn = connect(IDEMPOTENCY_PATH)
+    if not _schema_ready:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS idempotency ("
+            "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, state TEXT NOT NULL, "
+            "status INTEGER, mimetype TEXT, body BLOB, created REAL NOT NULL)"
+        )
+        _schema_ready = True
+    return conn
+
+
+def _claim(conn, key, fingerprint):
+    """Try to register this request as the owner of `key`; True if we now own it"""
+    now = time.time()
+    conn.execute(
+        "DELETE FROM idempotency WHERE key = ? AND ("
+        "(state = 'done' AND created < ?) OR (state = 'pending' AND created < ?))",
+        (key, now - IDEMPOTENCY_TTL, now - IDEMPOTENCY_PENDING_TIMEOUT)
+    )
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO idempotency (key, fingerprint, state, created) VALUES (?, ?, 'pending', ?)",
+        (key, fingerprint, now)
+    )
+    return cursor.rowcount == 1
+
+
+def _replay(row):
+    _, _, status, mimetype, body = row
+    response = Response(body, status=status, mimetype=mimetype)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(view):
+    """Make a POST view safe to retry with an Idempotency-Key header.
+
+    The first request with a given key runs the view; its response is stored
+    for IDEMPOTENCY_TTL seconds and replayed to any retry carrying the same
+    key. A retry that arrives (on any worker) while the original is still
+    running waits up to IDEMPOTENCY_WAIT seconds for it, then gets 409 with
+    Retry-After. Requests without the header are unaffected.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        client_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if request.method != "POST" or not client_key:
+            return view(*args, **kwargs)
+
+        key = f"{request.path}:{client_key}"
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+        try:
+            conn = _db()
+            owner = _claim(conn, key, fingerprint)
+        except Exception as e:
+            log.warning("Idempotency store unavailable: %s", e)
+            return view(*args, **kwargs)
+
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT
+        while not owner:
+            row = conn.execute(
+                "SELECT fingerprint, state, status, mimetype, body FROM idempotency WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                # The original failed and released the key; run it ourselves
+                owner = _claim(conn, key, fingerprint)
+                continue
+            if row[0] != fingerprint:
+                return jsonify({"error": f"{IDEMPOTENCY_HEADER} was already used with a different request body"}), 422
+            if row[1] == "done":
+                return _replay(row)
+            if time.monotonic() >= deadline:
+                response = jsonify({"error": f"A request with this {IDEMPOTENCY_HEADER} is still in progress"})
+                response.status_code = 409
+                response.headers["Retry-After"] = str(IDEMPOTENCY_RETRY_AFTER)
+                return response
+            time.sleep(_POLL_INTERVAL)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            conn.execute("DELETE FROM idempotency WHERE key = ?", (key,))
+            raise
+
+        if response.is_streamed or response.status_code >= 500 or response.status_code in _RETRYABLE_STATUSES:
+            # Nothing replayable: let the next retry run again
+            conn.execute("DELETE FROM idempotency WHERE key = ?", (key,))
+        else:
+            conn.execute(
+                "UPDATE idempotency SET state = 'done', status = ?, mimetype = ?, body = ?, created = ? WHERE key = ?",
+                (response.status_code, response.mimetype, response.get_data(), time.time(), key)
+            )
+        return response
+
+    return wrapper
@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from flask import Blueprint, request, jsonify
+from storage import connect, data_path, pid_alive
+import metrics
+import tracing
+import response_cache
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# Background generations run on a bounded pool so they cannot starve the request workers
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Submissions beyond this many queued jobs (per worker process) are rejected with 503
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "32"))
+# Finished jobs (and their results) are kept this long for polling
+JOB_TTL = int(os.getenv("JOB_TTL_SECONDS", str(60 * 60)))
+# Jobs still queued or running this long after submission are marked failed (their worker hung or died)
+JOB_DEADLINE = int(os.getenv("JOB_DEADLINE_SECONDS", str(30 * 60)))
+JOBS_PATH = os.getenv("JOBS_PATH") or data_path("jobs.sqlite3")
+
+jobs_bp = Blueprint("jobs", __name__)
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_lock = threading.Lock()
+_futures = {}  # job_id -> Future, for jobs submitted by this worker
+_stats = {"submitted": 0, "rejected": 0, "started": 0, "completed": 0, "failed": 0, "cancelled": 0,
+          "queued": 0, "running": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+_schema_ready = False
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _db():
+    global _schema_ready
+    conn = connect(JOBS_PATH)
+    if not _schema_ready:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, endpoint TEXT NOT NULL, state TEXT NOT NULL, "
+            "status_code INTEGER, result TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0, "
+            "submitted REAL NOT NULL, started REAL, finished REAL, "
+            "host TEXT NOT NULL DEFAULT '', pid INTEGER NOT NULL DEFAULT 0)"
+        )
+        for column in ("host TEXT NOT NULL DEFAULT ''", "pid INTEGER NOT NULL DEFAULT 0"):
+            try:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass  # column already exists
+        _schema_ready = True
+    return conn
+
+
+def wants_async():
+    """True when the client asked for a job instead of waiting (?async=1 or Prefer: respond-async)"""
+    if request.args.get("async") == "1":
+        return True
+    return "respond-async" in request.headers.get("Prefer", "")
+
+
+def submit(endpoint, fn):
+    """Queue `fn` (returning (result, status_code)) and return the new job id"""
+    with _lock:
+        if _stats["queued"] >= JOB_QUEUE_MAX:
+            _stats["rejected"] += 1
+            raise QueueFull()
+        _stats["submitted"] += 1
+        _stats["queued"] += 1
+
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    conn = _db()
+    _expire(conn, now)
+    conn.execute(
+        "INSERT INTO jobs (id, endpoint, state, submitted, host, pid) VALUES (?, ?, 'queued', ?, ?, ?)",
+        (job_id, endpoint, now, metrics.HOSTNAME, os.getpid())
+    )
+
+    future = _executor.submit(
+        _run, job_id, endpoint, fn, now, tracing.trace_id.get(), response_cache.bypass_requested()
+    )
+    with _lock:
+        _futures[job_id] = future
+    return job_id
+
+
+def _expire(conn, now):
+    """Drop finished jobs older than JOB_TTL and fail the ones that will never finish.
+
+    A job is abandoned when it has outlived JOB_DEADLINE, or when the worker
+    that queued it is gone (checked for this host's workers only: other
+    hosts' pids mean nothing here). Abandoned jobs then age out like any other.
+    """
+    conn.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (now - JOB_TTL,))
+    abandoned = [
+        (job_id, "Job did not finish in time")
+        for job_id, in conn.execute(
+            "SELECT id FROM jobs WHERE finished IS NULL AND submitted < ?", (now - JOB_DEADLINE,)
+        )
+    ]
+    rows = conn.execute(
+        "SELECT id, pid FROM jobs WHERE finished IS NULL AND host = ? AND pid != ?", (metrics.HOSTNAME, os.getpid())
+    ).fetchall()
+    abandoned += [(job_id, "The worker running the job exited") for job_id, pid in rows if not pid_alive(pid)]
+
+    for job_id, error in abandoned:
+        cursor = conn.execute(
+            "UPDATE jobs SET state = 'failed', status_code = 500, result = ?, finished = ? "
+            "WHERE id = ? AND finished IS NULL",
+            (json.dumps({"error": error}), now, job_id)
+        )
+        if cursor.rowcount:
+            log.warning("job abandoned", extra=tracing.fields(job_id=job_id, error=error))
+
+
+def _finish(conn, job_id, state, status_code=None, result=None):
+    conn.execute(
+        "UPDATE jobs SET state = ?, status_code = ?, result = ?, finished = ? WHERE id = ?",
+        (state, status_code, None if result is None else json.dumps(result), time.time(), job_id)
+    )
+    with _lock:
+        _stats[{"done": "completed"}.get(state, state)] += 1
+        _futures.pop(job_id, None)
+
+
+def _run(job_id, endpoint, fn, submitted, trace, cache_bypass):
+    started = time.time()
+    wait = started - submitted
+    metrics.observe("ai4cs_queue_wait_seconds", ("jobs", endpoint), wait)
+    # Upstream calls and logs of the job are attributed to the request that queued it
+    metrics.current_endpoint.set(endpoint)
+    tracing.trace_id.set(trace)
+    response_cache.bypass.set(cache_bypass)
+    with _lock:
+        _stats["queued"] -= 1
+        _stats["running"] += 1
+        _stats["started"] += 1
+        _stats["wait_seconds_total"] += wait
+        _stats["wait_seconds_max"] = max(_stats["wait_seconds_max"], wait)
+
+    conn = _db()
+    try:
+        row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row[0]:
+            _finish(conn, job_id, "cancelled")
+            return
+
+        conn.execute("UPDATE jobs SET state = 'running', started = ? WHERE id = ?", (started, job_id))
+        try:
+            result, status_code = fn()
+        except Exception as e:
+            _finish(conn, job_id, "failed", 500, {"error": str(e)})
+            return
+
+        if conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]:
+            _finish(conn, job_id, "cancelled")
+        else:
+            _finish(conn, job_id, "done" if status_code == 200 else "failed", status_code, result)
+    finally:
+        with _lock:
+            _stats["running"] -= 1
+
+
+def get_job(job_id):
+    row = _db().execute(
+        "SELECT endpoint, state, status_code, result, submitted, started, finished FROM jobs WHERE id = ?",
+        (job_id,)
+    ).fetchone()
+    if row is None:
+        return None
+
+    endpoint, state, status_code, result, submitted, started, finished = row
+    job = {
+        "jobId": job_id,
+        "endpoint": endpoint,
+        "status": state,
+        "submittedAt": submitted,
+        "startedAt": started,
+        "finishedAt": finished
+    }
+    if state in ("done", "failed"):
+        job["statusCode"] = status_code
+        job["result"] = json.loads(result) if result else None
+    return job
+
+
+def cancel_job(job_id):
+    """Request cancellation; a queued job never runs and a running job's result is discarded"""
+    conn = _db()
+    cursor = conn.execute(
+        "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND state IN ('queued', 'running')", (job_id,)
+    )
+    if cursor.rowcount == 0:
+        return False
+
+    with _lock:
+        future = _futures.get(job_id)
+    if future is not None and future.cancel():
+        with _lock:
+            _stats["queued"] -= 1
+        _finish(conn, job_id, "cancelled")
+    return True
+
+
+def stats():
+    with _lock:
+        snapshot = dict(_stats)
+    started = snapshot["started"]
+    snapshot["wait_seconds_avg"] = round(snapshot["wait_seconds_total"] / started, 3) if started else 0.0
+    snapshot["workers"] = JOB_WORKERS
+    snapshot["queue_max"] = JOB_QUEUE_MAX
+    return snapshot
+
+
+def accepted_response(endpoint, fn):
+    """Submit a job and return the 202 response pointing at its status URL"""
+    try:
+        job_id = submit(endpoint, fn)
+    except QueueFull:
+        return jsonify({"error": "Too many queued jobs. Please try again shortly."}), 503
+
+    status_url = f"/jobs/{job_id}"
+    response = jsonify({"jobId": job_id, "status": "queued", "statusUrl": status_url})
+    response.status_code = 202
+    response.headers["Location"] = status_url
+    return response
+
+
+@jobs_bp.route("/stats", methods=["GET"])
+def job_stats():
+    """Queue depth and wait times for this worker"""
+    return jsonify(stats())
+
+
+@jobs_bp.route("/<job_id>", methods=["GET", "DELETE"])
+def job_status(job_id):
+    """Poll a job (GET) or cancel it (DELETE)"""
+    if request.method == "DELETE":
+        if not cancel_job(job_id):
+            return jsonify({"error": "Job not found or already finished"}), 404
+
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    return jsonify(job)
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import bisect
+import socket
+import sqlite3
+import threading
+import contextvars
+import logging
+from dotenv import load_dotenv
+from flask import request, has_request_context
+from storage import connect, data_path, pid_alive
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# Each worker keeps its metrics in memory and writes a snapshot to this file
+# every METRICS_FLUSH_INTERVAL seconds; /metrics merges the snapshots of all
+# workers sharing it (one host, or several with AI4CS_DATA_DIR on a shared
+# volume), so scraped values lag by at most one interval.
+METRICS_PATH = os.getenv("METRICS_PATH") or data_path("metrics.sqlite3")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL_SECONDS", "5"))
+
+# USD per million tokens as (input, output), for the estimated cost counter.
+# Override with GEMINI_PRICES='{"model": [input, output], ...}' when pricing changes.
+MODEL_PRICES = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+}
+MODEL_PRICES.update({model: tuple(price) for model, price in json.loads(os.getenv("GEMINI_PRICES", "{}")).items()})
+
+# Snapshot rows are tagged with the host, since a pid only identifies a process on its own host
+HOSTNAME = socket.gethostname()
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+MB = 1024 * 1024
+SIZE_BUCKETS = (0.1 * MB, 0.5 * MB, 1 * MB, 5 * MB, 10 * MB, 25 * MB, 50 * MB, 100 * MB, 250 * MB, 500 * MB)
+
+# Counters and histograms exposed on /metrics: name -> (type, label names, help, buckets)
+METRICS = {
+    "ai4cs_upstream_requests_total": (
+        "counter", ("endpoint", "model", "status", "finish_reason"),
+        "Gemini calls by endpoint, model, HTTP status and finish reason", None),
+    "ai4cs_upstream_latency_seconds": (
+        "histogram", ("endpoint", "model"),
+        "Gemini call duration, to the end of the stream for streamed calls", LATENCY_BUCKETS),
+    "ai4cs_prompt_tokens_total": (
+        "counter", ("endpoint", "model"), "Prompt tokens reported in usageMetadata", None),
+    "ai4cs_output_tokens_total": (
+        "counter", ("endpoint", "model"), "Output (candidates) tokens reported in usageMetadata", None),
+    "ai4cs_queue_wait_seconds": (
+        "histogram", ("queue", "endpoint"), "Time a background job waited before it started", QUEUE_WAIT_BUCKETS),
+    "ai4cs_upload_bytes": (
+        "histogram", ("format",), "Size of files uploaded for text extraction", SIZE_BUCKETS),
+    "ai4cs_upload_peak_rss_growth_bytes": (
+        "histogram", ("format",), "Worker RSS growth while an upload was received and extracted", SIZE_BUCKETS),
+}
+
+# The route that started a call made outside a request context (background jobs)
+current_endpoint = contextvars.ContextVar("current_endpoint", default=None)
+
+_worker_id = None
+_lock = threading.Lock()
+_values = {}  # (name, labels) -> number for counters, [bucket counts..., +Inf count, sum, count] for histograms
+_flusher_pid = None
+_schema_ready = False
+
+
+def _db():
+    global _schema_ready
+    conn = connect(METRICS_PATH)
+    if not _schema_ready:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS metrics ("
+            "worker TEXT PRIMARY KEY, pid INTEGER NOT NULL, snapshot TEXT NOT NULL, updated REAL NOT NULL, "
+            "host TEXT NOT NULL DEFAULT '')"
+        )
+        try:
+            conn.execute("ALTER TABLE metrics ADD COLUMN host TEXT NOT NULL DEFAULT ''")
+        except sqlite3.OperationalError:
+            pass  # column already exists
+        _schema_ready = True
+    return conn
+
+
+def endpoint_label():
+    """The route template of the current request (or of the job that is running)"""
+    endpoint = current_endpoint.get()
+    if endpoint is not None:
+        return endpoint
+    if has_request_context():
+        return request.url_rule.rule if request.url_rule is not None else request.path
+    return "none"
+
+
+def inc(name, labels, amount=1):
+    _ensure_flusher()
+    key = (name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + amount
+
+
+def observe(name, labels, value):
+    _ensure_flusher()
+    buckets = METRICS[name][3]
+    key = (name, labels)
+    with _lock:
+        series = _values.get(key)
+        if series is None:
+            series = _values[key] = [0] * (len(buckets) + 3)
+        series[bisect.bisect_left(buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+
+def observe_upstream(model, status_code, finish_reason, latency, usage):
+    """Record one Gemini call: counts, latency and the token usage it reported"""
+    endpoint = endpoint_label()
+    inc("ai4cs_upstream_requests_total", (endpoint, model, str(status_code), finish_reason or "none"))
+    observe("ai4cs_upstream_latency_seconds", (endpoint, model), latency)
+    if usage:
+        inc("ai4cs_prompt_tokens_total", (endpoint, model), usage.get("promptTokenCount", 0))
+        inc("ai4cs_output_tokens_total", (endpoint, model), usage.get("candidatesTokenCount", 0))
+
+
+def finish_reason(result):
+    candidates = result.get("candidates") if isinstance(result, dict) else None
+    if not candidates:
+        return None
+    return candidates[0].get("finishReason")
+
+
+def _snapshot():
+    with _lock:
+        return [[name, list(labels), value if isinstance(value, (int, float)) else list(value)]
+                for (name, labels), value in _values.items()]
+
+
+def flush():
+    """Write this worker's metrics to the shared file"""
+    global _worker_id
+    if _worker_id is None or _worker_id[0] != os.getpid():
+        _worker_id = (os.getpid(), f"{HOSTNAME}-{os.getpid()}-{time.time_ns()}")
+    _db().execute(
+        "INSERT OR REPLACE INTO metrics (worker, host, pid, snapshot, updated) VALUES (?, ?, ?, ?, ?)",
+        (_worker_id[1], HOSTNAME, os.getpid(), json.dumps(_snapshot(), separators=(",", ":")), time.time())
+    )
+
+
+def _merge(total, snapshot):
+    for name, labels, value in snapshot:
+        key = (name, tuple(labels))
+        if isinstance(value, list):
+            series = total.setdefault(key, [0] * len(value))
+            for index, count in enumerate(value):
+                series[index] += count
+        else:
+            total[key] = total.get(key, 0) + value
+
+
+def collect():
+    """Metrics of every worker sharing the metrics file, merged.
+
+    Snapshots of this host's workers that have exited are folded into a
+    single "retired" row so counters keep growing across worker restarts.
+    Rows from other hosts are left to those hosts: their pids mean nothing here.
+    """
+    flush()
+    conn = _db()
+    total = {}
+    exited = []
+    for worker, host, pid, snapshot in conn.execute("SELECT worker, host, pid, snapshot FROM metrics"):
+        _merge(total, json.loads(snapshot))
+        if worker != "retired" and host == HOSTNAME and not pid_alive(pid):
+            exited.append(worker)
+
+    if exited:
+        _retire(conn, exited)
+    return total
+
+
+def _retire(conn, workers):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        retired = {}
+        for worker in ["retired"] + workers:
+            # Re-read inside the transaction: another worker may have folded the row already
+            row = conn.execute("SELECT snapshot FROM metrics WHERE worker = ?", (worker,)).fetchone()
+            if row is not None:
+                _merge(retired, json.loads(row[0]))
+        conn.executemany("DELETE FROM metrics WHERE worker = ?", [(worker,) for worker in workers])
+        conn.execute(
+            "INSERT OR REPLACE INTO metrics (worker, pid, snapshot, updated) VALUES ('retired', 0, ?, ?)",
+            (json.dumps([[name, list(labels), value] for (name, labels), value in retired.items()]), time.time())
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    total = collect()
+    lines = []
+    for name, (kind, label_names, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (series_name, labels), value in sorted(total.items()):
+            if series_name != name:
+                continue
+            if kind == "counter":
+                lines.append(f"{name}{_label_text(label_names, labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ("+Inf",), value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_label_text(label_names + ('le',), labels + (bound,))} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(label_names, labels)} {value[-2]}")
+            lines.append(f"{name}_count{_label_text(label_names, labels)} {value[-1]}")
+
+    # Derived from the token counters at scrape time, so the hot path never prices anything
+    lines.append("# HELP ai4cs_estimated_cost_usd_total Estimated Gemini spend from token usage and MODEL_PRICES")
+    lines.append("# TYPE ai4cs_estimated_cost_usd_total counter")
+    cost = {}
+    for (name, labels), value in total.items():
+        model = labels[1] if len(labels) > 1 else None
+        if model not in MODEL_PRICES:
+            continue
+        if name == "ai4cs_prompt_tokens_total":
+            cost[model] = cost.get(model, 0) + value * MODEL_PRICES[model][0] / 1e6
+        elif name == "ai4cs_output_tokens_total":
+            cost[model] = cost.get(model, 0) + value * MODEL_PRICES[model][1] / 1e6
+    for model, usd in sorted(cost.items()):
+        lines.append(f"ai4cs_estimated_cost_usd_total{_label_text(('model',), (model,))} {round(usd, 6)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _ensure_flusher():
+    # Started lazily (and once per process) so it survives gunicorn forking workers
+    global _flusher_pid
+    if _flusher_pid == os.getpid() or METRICS_FLUSH_INTERVAL <= 0:
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_forever, name="metrics-flusher", daemon=True).start()
+
+
+def _flush_forever():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            log.warning("Metrics flush failed: %s", e)
@@ -1,4 +1,13 @@
+from flask import request, jsonify
+from datetime import datetime
+from generation import generation_response
+from idempotency import idempotent
+from texttool import texttool_bp
+
+# Report routes, registered on the texttool blueprint when texttool imports this module
+
 @texttool_bp.route("/internship-report", methods=["POST"])
+@idempotent
 def internship_report():
     """Generate a comprehensive internship report"""
     try:
@@ -57,15 +66,15 @@ Instructions:
 Format the report professionally with proper academic structure. Remove all introductory paragraph, end notes and any other non-relevant content."""
         
         try:
-            result, status_code = call_gemini_api(prompt)
-            return jsonify(result), status_code
+            return generation_response(prompt)
         except Exception as e:
-            return jsonify({"error": str(e)}), 987
+            return jsonify({"error": str(e)}), 500
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @texttool_bp.route("/project-report", methods=["POST"])
+@idempotent
 def project_report():
     """Generate a comprehensive project report"""
     try:
@@ -122,13 +131,13 @@ Instructions:
 
 Format the report professionally with proper technical structure. Remove all introductory paragraph, end notes and any other non-relevant content."""
 
-        result, status_code = call_gemini_api(prompt)
-        return jsonify(result), status_code
+        return generation_response(prompt)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @texttool_bp.route("/technical-report", methods=["POST"])
+@idempotent
 def technical_report():
     """Generate a comprehensive technical report"""
     try:
@@ -181,13 +190,13 @@ Instructions:
 
 Format the report professionally with proper technical structure. Remove all introductory paragraph, end notes and any other non-relevant content."""
 
-        result, status_code = call_gemini_api(prompt)
-        return jsonify(result), status_code
+        return generation_response(prompt)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @texttool_bp.route("/business-market-report", methods=["POST"])
+@idempotent
 def business_market_report():
     """Generate a comprehensive business/market report"""
     try:
@@ -239,13 +248,13 @@ Instructions:
 
 Format the report professionally with proper business structure. Remove all introductory paragraph, end notes and any other non-relevant content."""
 
-        result, status_code = call_gemini_api(prompt)
-        return jsonify(result), status_code
+        return generation_response(prompt)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @texttool_bp.route("/incident-status-report", methods=["POST"])
+@idempotent
 def incident_status_report():
     """Generate a comprehensive incident/status report"""
     try:
@@ -294,8 +303,7 @@ Instructions:
 
 Format the report professionally with proper incident structure. Remove all introductory paragraph, end notes and any other non-relevant content."""
 
-        result, status_code = call_gemini_api(prompt)
-        return jsonify(result), status_code
+        return generation_response(prompt)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
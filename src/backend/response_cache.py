@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+import logging
+import contextvars
+from collections import OrderedDict
+from dotenv import load_dotenv
+from flask import request, has_request_context
+from storage import connect, data_path, evict_lru
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(24 * 3600)))
+MEMORY_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MEMORY_ENTRIES", "256"))
+# Cap on the uncompressed JSON size of the results held in each worker's memory tier
+MEMORY_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MEMORY_MAX_BYTES", str(32 * 1024 * 1024)))
+DISK_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+DISK_PATH = os.getenv("RESPONSE_CACHE_PATH") or data_path("response_cache.sqlite3")
+
+# Clients send this header (any value other than "0") to skip the cache for one request
+BYPASS_HEADER = "X-Cache-Bypass"
+
+# Background jobs have no request; they carry the bypass choice of the request that queued them
+bypass = contextvars.ContextVar("cache_bypass", default=False)
+
+_lock = threading.Lock()
+_memory = OrderedDict()  # key -> (stored_at, uncompressed size, result)
+_memory_bytes = 0
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "bypassed": 0}
+_schema_ready = False
+
+
+def cache_key(model, generation_config, contents):
+    """Stable hash of a generateContent request; whitespace around prompt text is ignored"""
+    normalized = [
+        {
+            "role": message.get("role", "user"),
+            "parts": [part.get("text", "").strip() for part in message.get("parts", [])]
+        }
+        for message in contents
+    ]
+    raw = json.dumps(
+        {"model": model, "generationConfig": generation_config or {}, "contents": normalized},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def bypass_requested():
+    """True when the current request (or the one that queued the running job) asked to skip the response cache"""
+    if not has_request_context():
+        return bypass.get()
+    if request.headers.get(BYPASS_HEADER, "0") != "0":
+        return True
+    return "no-cache" in request.headers.get("Cache-Control", "")
+
+
+def _db():
+    global _schema_ready
+    conn = connect(DISK_PATH)
+    if not _schema_ready:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS response_cache_accessed ON response_cache (accessed)")
+        _schema_ready = True
+    return conn
+
+
+def _remember(key, stored_at, size, result):
+    """Insert into the in-process LRU tier, evicting the least recently used entries.
+
+    A result larger than MEMORY_MAX_BYTES on its own is served from disk only.
+    """
+    global _memory_bytes
+    with _lock:
+        previous = _memory.pop(key, None)
+        if previous is not None:
+            _memory_bytes -= previous[1]
+        if size > MEMORY_MAX_BYTES:
+            return
+        _memory[key] = (stored_at, size, result)
+        _memory_bytes += size
+        while len(_memory) > MEMORY_MAX_ENTRIES or _memory_bytes > MEMORY_MAX_BYTES:
+            _, (_, evicted_size, _) = _memory.popitem(last=False)
+            _memory_bytes -= evicted_size
+
+
+def get(key):
+    """Return a cached result for `key`, or None on a miss"""
+    global _memory_bytes
+    now = time.time()
+
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            if now - entry[0] < CACHE_TTL:
+                _memory.move_to_end(key)
+                _stats["memory_hits"] += 1
+                return entry[2]
+            del _memory[key]
+            _memory_bytes -= entry[1]
+
+    try:
+        conn = _db()
+        row = conn.execute(
+            "SELECT value, created FROM response_cache WHERE key = ? AND created > ?",
+            (key, now - CACHE_TTL)
+        ).fetchone()
+        if row is not None:
+            conn.execute("UPDATE response_cache SET accessed = ? WHERE key = ?", (now, key))
+    except Exception as e:
+        log.warning("Response cache read failed: %s", e)
+        row = None
+
+    if row is None:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    raw = zlib.decompress(row[0])
+    result = json.loads(raw)
+    _remember(key, row[1], len(raw), result)
+    with _lock:
+        _stats["disk_hits"] += 1
+    return result
+
+
+def put(key, result):
+    """Store a successful result in both tiers"""
+    now = time.time()
+    raw = json.dumps(result, separators=(",", ":")).encode("utf-8")
+    blob = zlib.compress(raw)
+    _remember(key, now, len(raw), result)
+
+    try:
+        conn = _db()
+        conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, blob, len(blob), now, now)
+        )
+        evict_lru(conn, "response_cache", CACHE_TTL, DISK_MAX_BYTES, now)
+    except Exception as e:
+        log.warning("Response cache write failed: %s", e)
+        return
+
+    with _lock:
+        _stats["stores"] += 1
+
+
+def get_or_generate(key, generate):
+    """Serve `key` from the cache, or call `generate()` and cache a 200 result.
+
+    `generate` returns the usual (result, status_code) tuple.
+    """
+    if not CACHE_ENABLED:
+        return generate()
+
+    if bypass_requested():
+        with _lock:
+            _stats["bypassed"] += 1
+        return generate()
+
+    cached = get(key)
+    if cached is not None:
+        return cached, 200
+
+    result, status_code = generate()
+    if status_code == 200:
+        put(key, result)
+    return result, status_code
+
+
+def stats():
+    """Hit/miss counters for this worker plus bytes held by each tier"""
+    with _lock:
+        snapshot = dict(_stats)
+        snapshot["memory_entries"] = len(_memory)
+        snapshot["memory_bytes"] = _memory_bytes
+        snapshot["memory_max_bytes"] = MEMORY_MAX_BYTES
+
+    lookups = snapshot["memory_hits"] + snapshot["disk_hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = round((snapshot["memory_hits"] + snapshot["disk_hits"]) / lookups, 4) if lookups else 0.0
+
+    try:
+        entries, size = _db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache").fetchone()
+    except Exception:
+        entries, size = 0, 0
+    snapshot["disk_entries"] = entries
+    snapshot["disk_bytes"] = size
+    return snapshot
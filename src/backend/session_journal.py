@@ -0,0 +1,192 @@
+import os
+import json
+import zlib
+import fcntl
+import struct
+import threading
+from contextlib import contextmanager
+
+# Each journal record is a frame: a 4-byte length and a 4-byte CRC32 of the
+# payload, then the payload, a zlib-compressed compact JSON object:
+#   {"id": session_id, "t": saved_at, "s": session}           full snapshot
+#   {"id": session_id, "t": saved_at, "d": {...}, "p": {...},  delta against the
+#    "a": {...}, "r": [...]}                                   previous record
+#   {"id": session_id, "t": removed_at, "x": reason}           removal
+# In a delta, "d" sets keys, "r" removes keys, and for list values "p" drops
+# that many items from the front before "a" appends new items. Appending turns
+# this way keeps a record to the size of the turn rather than the session.
+_HEADER = struct.Struct(">II")
+_COMPRESS_LEVEL = 6
+
+
+def encode_record(record):
+    payload = zlib.compress(
+        json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode("utf-8"), _COMPRESS_LEVEL
+    )
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_record(payload):
+    return json.loads(zlib.decompress(payload))
+
+
+def _dropped_prefix(before, after):
+    """Items dropped from the front of `before` if `after` is the rest of it plus new items, else None"""
+    for dropped in range(len(before) + 1):
+        kept = len(before) - dropped
+        if after[:kept] == before[dropped:]:
+            return dropped
+    return None
+
+
+def diff_session(before, after):
+    """The delta fields that turn session `before` into `after`"""
+    delta = {}
+    for key, value in after.items():
+        if key in before and before[key] == value:
+            continue
+        previous = before.get(key)
+        if isinstance(value, list) and isinstance(previous, list):
+            dropped = _dropped_prefix(previous, value)
+            if dropped is not None:
+                if dropped:
+                    delta.setdefault("p", {})[key] = dropped
+                added = value[len(previous) - dropped:]
+                if added:
+                    delta.setdefault("a", {})[key] = added
+                continue
+        delta.setdefault("d", {})[key] = value
+
+    removed = [key for key in before if key not in after]
+    if removed:
+        delta["r"] = removed
+    return delta
+
+
+def apply_delta(session, record):
+    """Apply a delta record to `session` in place"""
+    session.update(record.get("d", {}))
+    for key in record.get("r", ()):
+        session.pop(key, None)
+    for key, dropped in record.get("p", {}).items():
+        del session[key][:dropped]
+    for key, added in record.get("a", {}).items():
+        session.setdefault(key, []).extend(added)
+    return session
+
+
+class SessionJournal:
+    """Append-only journal file shared by every worker on the host.
+
+    Appends are single O_APPEND writes made under an exclusive flock on a
+    sidecar lock file, so workers can interleave records safely. Compaction
+    replaces the file with a fresh one holding one snapshot per live session;
+    readers notice the new inode and replay it from the start.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self._thread_lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._lock_fd = None
+
+    @contextmanager
+    def locked(self):
+        """Exclusive access to the journal across threads and processes"""
+        with self._thread_lock:
+            self._ensure_open()
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def reading(self):
+        """Serialize in-process readers with appends without taking the file lock"""
+        with self._thread_lock:
+            self._ensure_open()
+            yield
+
+    def inode(self):
+        return os.fstat(self._fd).st_ino
+
+    def replaced(self):
+        """True when another process compacted the journal since this one opened it"""
+        try:
+            return os.stat(self.path).st_ino != self.inode()
+        except FileNotFoundError:
+            return True
+
+    def reopen(self):
+        os.close(self._fd)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def size(self):
+        return os.fstat(self._fd).st_size
+
+    def read_from(self, offset):
+        """Record payloads written after `offset`; returns (payloads, new_offset, corrupt).
+
+        A trailing partial or unverifiable frame (a write still in progress, or
+        torn by a crash) is left for the next call; a bad frame followed by
+        others is skipped and counted in `corrupt`.
+        """
+        size = self.size()
+        if size <= offset:
+            return [], offset, 0
+        data = os.pread(self._fd, size - offset, offset)
+
+        payloads = []
+        corrupt = 0
+        position = 0
+        while position + _HEADER.size <= len(data):
+            length, checksum = _HEADER.unpack_from(data, position)
+            end = position + _HEADER.size + length
+            if end > len(data):
+                break
+            payload = data[position + _HEADER.size:end]
+            if zlib.crc32(payload) != checksum:
+                if end == len(data):
+                    break
+                corrupt += 1
+            else:
+                payloads.append(payload)
+            position = end
+        return payloads, offset + position, corrupt
+
+    def truncate(self, offset):
+        """Drop anything after `offset`, i.e. a record torn by a crash (caller holds the lock)"""
+        if self.size() > offset:
+            os.ftruncate(self._fd, offset)
+
+    def append(self, record):
+        """Append one record (caller holds the lock); returns the bytes written"""
+        frame = encode_record(record)
+        os.write(self._fd, frame)
+        if self.fsync:
+            os.fsync(self._fd)
+        return len(frame)
+
+    def rewrite(self, records):
+        """Atomically replace the journal with `records` (caller holds the lock)"""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            for record in records:
+                f.write(encode_record(record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.reopen()
+        return self.size()
+
+    def _ensure_open(self):
+        # File descriptors (and the flock that belongs to them) must not be
+        # shared with a parent process, so they are opened once per pid
+        if self._pid == os.getpid():
+            return
+        self._fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+        self._lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        self._pid = os.getpid()
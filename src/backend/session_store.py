@@ -0,0 +1,541 @@
+import os
+import copy
+import json
+import time
+import zlib
+import sqlite3
+import threading
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dotenv import load_dotenv
+from storage import connect, data_path
+from session_journal import SessionJournal, decode_record, diff_session, apply_delta
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# "journal" keeps sessions in each worker and appends every change to a journal
+# on disk, so they survive restarts; "memory" keeps them in each worker only;
+# "sqlite" shares one table between all workers on the host
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "journal")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH") or data_path("sessions.sqlite3")
+SESSION_JOURNAL_PATH = os.getenv("SESSION_JOURNAL_PATH") or data_path("sessions.journal")
+# fsync every append: survives a host crash, not just a process restart, at a much higher write cost
+SESSION_JOURNAL_FSYNC = os.getenv("SESSION_JOURNAL_FSYNC", "0") == "1"
+# Rewrite the journal as one snapshot per live session once it grows past this size
+SESSION_JOURNAL_COMPACT_BYTES = int(os.getenv("SESSION_JOURNAL_COMPACT_BYTES", str(16 * 1024 * 1024)))
+
+# Idle sessions are dropped after this many seconds without a turn
+SESSION_TTL = int(os.getenv("SESSION_TTL_SECONDS", str(2 * 3600)))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "1000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+# A turn lease not released within this many seconds (crashed worker) is ignored
+SESSION_LEASE_SECONDS = int(os.getenv("SESSION_LEASE_SECONDS", "300"))
+
+# Remember this many removed session ids so their owners get "expired" rather than "invalid"
+_TOMBSTONE_LIMIT = 10000
+
+
+class SessionNotFound(Exception):
+    """The session id was never issued by this store"""
+
+
+class SessionExpired(Exception):
+    """The session existed but was removed (idle timeout or capacity eviction)"""
+
+    def __init__(self, session_id, reason):
+        super().__init__(f"Session {session_id} {reason}")
+        self.reason = reason
+
+
+class SessionBusy(Exception):
+    """Another request is already processing a turn for this session"""
+
+
+class SessionConflict(Exception):
+    """The session was changed by another writer since it was loaded"""
+
+
+def encode_session(session):
+    return json.dumps(session, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def session_size(session):
+    return len(encode_session(session))
+
+
+class SessionStore(ABC):
+    """Common limits, counters and background sweeping for the session backends"""
+
+    def __init__(self, ttl=SESSION_TTL, max_entries=SESSION_MAX_ENTRIES, max_bytes=SESSION_MAX_BYTES,
+                 sweep_interval=SESSION_SWEEP_INTERVAL):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired_idle": 0, "evicted_entries": 0, "evicted_bytes": 0,
+                       "busy_rejections": 0, "version_conflicts": 0}
+        self._sweeper_pid = None
+
+    @abstractmethod
+    def load(self, session_id):
+        """Return a private copy of the session, raising SessionExpired or SessionNotFound"""
+
+    @abstractmethod
+    def save(self, session_id, session):
+        """Store the session and bump session["version"].
+
+        Raises SessionConflict if the stored version is no longer the one
+        the caller loaded (optimistic concurrency control).
+        """
+
+    @abstractmethod
+    def acquire(self, session_id):
+        """Take the turn lease for a session, raising SessionBusy if another request holds it"""
+
+    @abstractmethod
+    def release(self, session_id):
+        """Give back the turn lease taken by acquire()"""
+
+    @abstractmethod
+    def delete(self, session_id):
+        """Remove the session; a missing session is not an error"""
+
+    @abstractmethod
+    def sweep(self):
+        """Drop every session idle for longer than the TTL and return how many"""
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot.update(max_entries=self.max_entries, max_bytes=self.max_bytes, ttl_seconds=self.ttl)
+        return snapshot
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _ensure_sweeper(self):
+        # Started lazily (and once per process) so it survives gunicorn forking workers
+        if self._sweeper_pid == os.getpid() or self.sweep_interval <= 0:
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep_forever, name="session-sweeper", daemon=True).start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                log.warning("Session sweep failed: %s", e)
+
+
+class MemorySessionStore(SessionStore):
+    """In-process session store with idle expiry and LRU caps on entry count and total bytes"""
+
+    def __init__(self, **limits):
+        super().__init__(**limits)
+        self._sessions = OrderedDict()  # session_id -> [session, size, last_access]
+        self._bytes = 0
+        self._tombstones = OrderedDict()  # session_id -> reason
+        self._leases = {}  # session_id -> lease expiry
+
+    def load(self, session_id):
+        """Return the session dict, raising SessionExpired or SessionNotFound"""
+        self._ensure_sweeper()
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and now - entry[2] > self.ttl:
+                self._remove(session_id, "expired")
+                self._stats["expired_idle"] += 1
+                entry = None
+
+            if entry is None:
+                self._stats["misses"] += 1
+                reason = self._tombstones.get(session_id)
+                if reason is not None:
+                    raise SessionExpired(session_id, reason)
+                raise SessionNotFound(session_id)
+
+            entry[2] = now
+            self._sessions.move_to_end(session_id)
+            self._stats["hits"] += 1
+            return copy.deepcopy(entry[0])
+
+    def save(self, session_id, session):
+        """Insert or update a session, then evict least recently used sessions beyond the caps"""
+        self._ensure_sweeper()
+        expected = session.get("version", 0)
+        stored = copy.deepcopy(session)
+        stored["version"] = expected + 1
+        with self._lock:
+            previous = self._sessions.get(session_id)
+            if previous is not None and previous[0].get("version", 0) != expected:
+                self._stats["version_conflicts"] += 1
+                raise SessionConflict(session_id)
+            self._put(session_id, stored, time.time())
+        session["version"] = expected + 1
+
+    def acquire(self, session_id):
+        now = time.time()
+        with self._lock:
+            if self._leases.get(session_id, 0) > now:
+                self._stats["busy_rejections"] += 1
+                raise SessionBusy(session_id)
+            self._leases[session_id] = now + SESSION_LEASE_SECONDS
+
+    def release(self, session_id):
+        with self._lock:
+            self._leases.pop(session_id, None)
+
+    def delete(self, session_id):
+        with self._lock:
+            if session_id in self._sessions:
+                self._remove(session_id, "closed")
+
+    def sweep(self):
+        """Drop every session idle for longer than the TTL"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            idle = [sid for sid, entry in self._sessions.items() if entry[2] < cutoff]
+            for session_id in idle:
+                self._remove(session_id, "expired")
+            self._stats["expired_idle"] += len(idle)
+        return len(idle)
+
+    def stats(self):
+        snapshot = super().stats()
+        with self._lock:
+            snapshot["entries"] = len(self._sessions)
+            snapshot["bytes"] = self._bytes
+        snapshot["backend"] = "memory"
+        return snapshot
+
+    def _put(self, session_id, session, last_access):
+        # Caller holds self._lock
+        size = session_size(session)
+        previous = self._sessions.pop(session_id, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        self._sessions[session_id] = [session, size, last_access]
+        self._bytes += size
+
+        while len(self._sessions) > self.max_entries:
+            self._remove(next(iter(self._sessions)), "evicted")
+            self._stats["evicted_entries"] += 1
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            self._remove(next(iter(self._sessions)), "evicted")
+            self._stats["evicted_bytes"] += 1
+
+    def _remove(self, session_id, reason):
+        # Caller holds self._lock
+        entry = self._sessions.pop(session_id)
+        self._bytes -= entry[1]
+        self._tombstones[session_id] = reason
+        if len(self._tombstones) > _TOMBSTONE_LIMIT:
+            self._tombstones.popitem(last=False)
+
+
+class JournaledSessionStore(MemorySessionStore):
+    """In-process session store that appends every change to a journal on disk.
+
+    A save appends only what changed since the previous save (usually the new
+    answer and reply), so a turn costs a small write instead of rewriting the
+    whole session. The journal is replayed when the worker starts, so sessions
+    survive deploys and worker recycling, and it is caught up before each load
+    and save, so workers on the same host see each other's turns and a
+    concurrent save from another worker still raises SessionConflict. Turn
+    leases stay per process.
+
+    Idle expiry and the LRU caps are re-applied on replay from the record
+    timestamps, so only explicit deletes are journaled as removals.
+    """
+
+    def __init__(self, path=SESSION_JOURNAL_PATH, fsync=SESSION_JOURNAL_FSYNC,
+                 compact_bytes=SESSION_JOURNAL_COMPACT_BYTES, **limits):
+        super().__init__(**limits)
+        self.compact_bytes = compact_bytes
+        self._journal = SessionJournal(path, fsync=fsync)
+        self._offset = 0  # journal bytes already applied
+        self._inode = None
+        self._stats.update(journal_records_applied=0, journal_bad_records=0, journal_appends=0,
+                           journal_bytes_appended=0, journal_compactions=0)
+
+        started = time.perf_counter()
+        with self._journal.locked():
+            self._catch_up()
+            self._journal.truncate(self._offset)
+        self.replay_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.sweep()
+        log.info("Session journal replayed: %d sessions, %d bytes in %s ms", len(self._sessions), self._offset, self.replay_ms)
+
+    def load(self, session_id):
+        with self._journal.reading():
+            self._catch_up()
+        return super().load(session_id)
+
+    def save(self, session_id, session):
+        with self._journal.locked():
+            self._catch_up()
+            with self._lock:
+                entry = self._sessions.get(session_id)
+            # Stored sessions are replaced on save, never mutated, outside the journal lock
+            before = entry[0] if entry is not None else None
+
+            super().save(session_id, session)
+
+            record = {"id": session_id, "t": round(time.time(), 3)}
+            if before is None:
+                record["s"] = session
+            else:
+                record.update(diff_session(before, session))
+            self._append(record)
+
+            if self._offset > self.compact_bytes and self._offset > 2 * self._bytes:
+                self._compact()
+
+    def delete(self, session_id):
+        with self._journal.locked():
+            self._catch_up()
+            with self._lock:
+                if session_id not in self._sessions:
+                    return
+                self._remove(session_id, "closed")
+            self._append({"id": session_id, "t": round(time.time(), 3), "x": "closed"})
+
+    def compact(self):
+        """Rewrite the journal as one snapshot per live session"""
+        with self._journal.locked():
+            self._catch_up()
+            self._compact()
+
+    def stats(self):
+        snapshot = super().stats()
+        snapshot.update(backend="journal", journal_bytes=self._offset, journal_replay_ms=self.replay_ms)
+        return snapshot
+
+    def _append(self, record):
+        # Caller holds the journal lock and has caught up, so no append is in progress and
+        # anything after self._offset is a record torn by a worker that crashed mid-write.
+        # Drop it, or this record would land behind it where readers never get to.
+        self._journal.truncate(self._offset)
+        written = self._journal.append(record)
+        self._offset += written
+        with self._lock:
+            self._stats["journal_appends"] += 1
+            self._stats["journal_bytes_appended"] += written
+
+    def _compact(self):
+        # Caller holds the journal lock and has caught up
+        with self._lock:
+            records = [
+                {"id": session_id, "t": round(entry[2], 3), "s": entry[0]}
+                for session_id, entry in self._sessions.items()
+            ]
+        self._offset = self._journal.rewrite(records)
+        self._inode = self._journal.inode()
+        self._count("journal_compactions")
+
+    def _catch_up(self):
+        """Apply the records appended (by any worker) since the last call; caller holds the journal"""
+        if self._journal.replaced():
+            self._journal.reopen()
+        if self._journal.inode() != self._inode:
+            # First open, or another worker compacted the journal: rebuild from its snapshots
+            with self._lock:
+                self._sessions.clear()
+                self._bytes = 0
+            self._offset = 0
+            self._inode = self._journal.inode()
+
+        payloads, self._offset, corrupt = self._journal.read_from(self._offset)
+        with self._lock:
+            self._stats["journal_bad_records"] += corrupt
+            for payload in payloads:
+                self._apply(payload)
+
+    def _apply(self, payload):
+        # Caller holds the journal lock and self._lock
+        try:
+            record = decode_record(payload)
+            session_id = record["id"]
+        except (ValueError, KeyError, zlib.error):
+            self._stats["journal_bad_records"] += 1
+            return
+        self._stats["journal_records_applied"] += 1
+
+        entry = self._sessions.get(session_id)
+        if "x" in record:
+            if entry is not None:
+                self._remove(session_id, record["x"])
+            return
+        if "s" in record:
+            session = record["s"]
+        elif entry is not None:
+            session = apply_delta(entry[0], record)
+        else:
+            # A change to a session this worker already evicted
+            return
+        self._put(session_id, session, record["t"])
+
+
+class SqliteSessionStore(SessionStore):
+    """Session store in a SQLite (WAL) file shared by every worker on the host.
+
+    WAL relies on shared memory, so nodes should only share the file when they
+    run on the same host (e.g. containers with a common volume). Sessions are
+    stored as zlib-compressed compact JSON; limits are enforced on the shared
+    table, least recently updated first.
+    """
+
+    def __init__(self, path=SESSION_DB_PATH, **limits):
+        super().__init__(**limits)
+        self.path = path
+        self._schema_ready = False
+
+    def _db(self):
+        conn = connect(self.path)
+        if not self._schema_ready:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, updated REAL NOT NULL, "
+                "version INTEGER NOT NULL DEFAULT 0)"
+            )
+            try:
+                conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # column already exists
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+            conn.execute("CREATE TABLE IF NOT EXISTS session_leases (id TEXT PRIMARY KEY, expires REAL NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_tombstones ("
+                "id TEXT PRIMARY KEY, reason TEXT NOT NULL, removed REAL NOT NULL)"
+            )
+            self._schema_ready = True
+        return conn
+
+    def load(self, session_id):
+        self._ensure_sweeper()
+        conn = self._db()
+        row = conn.execute(
+            "SELECT data, version FROM sessions WHERE id = ? AND updated > ?", (session_id, time.time() - self.ttl)
+        ).fetchone()
+        if row is not None:
+            self._count("hits")
+            session = json.loads(zlib.decompress(row[0]))
+            session["version"] = row[1]
+            return session
+
+        self._count("misses")
+        if conn.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone():
+            self._remove(conn, [session_id], "expired")
+            self._count("expired_idle")
+            raise SessionExpired(session_id, "expired")
+
+        tombstone = conn.execute("SELECT reason FROM session_tombstones WHERE id = ?", (session_id,)).fetchone()
+        if tombstone is not None:
+            raise SessionExpired(session_id, tombstone[0])
+        raise SessionNotFound(session_id)
+
+    def save(self, session_id, session):
+        self._ensure_sweeper()
+        expected = session.get("version", 0)
+        stored = dict(session, version=expected + 1)
+        blob = zlib.compress(encode_session(stored))
+        conn = self._db()
+        now = time.time()
+
+        cursor = conn.execute(
+            "UPDATE sessions SET data = ?, size = ?, updated = ?, version = ? WHERE id = ? AND version = ?",
+            (blob, len(blob), now, expected + 1, session_id, expected)
+        )
+        if cursor.rowcount == 0:
+            try:
+                conn.execute(
+                    "INSERT INTO sessions (id, data, size, updated, version) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, blob, len(blob), now, expected + 1)
+                )
+            except sqlite3.IntegrityError:
+                # The row exists with another version: someone else saved first
+                self._count("version_conflicts")
+                raise SessionConflict(session_id)
+
+        session["version"] = expected + 1
+        self._enforce_limits(conn)
+
+    def acquire(self, session_id):
+        conn = self._db()
+        now = time.time()
+        conn.execute("DELETE FROM session_leases WHERE id = ? AND expires <= ?", (session_id, now))
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO session_leases (id, expires) VALUES (?, ?)",
+            (session_id, now + SESSION_LEASE_SECONDS)
+        )
+        if cursor.rowcount == 0:
+            self._count("busy_rejections")
+            raise SessionBusy(session_id)
+
+    def release(self, session_id):
+        self._db().execute("DELETE FROM session_leases WHERE id = ?", (session_id,))
+
+    def delete(self, session_id):
+        self._remove(self._db(), [session_id], "closed")
+
+    def sweep(self):
+        conn = self._db()
+        now = time.time()
+        idle = [row[0] for row in conn.execute("SELECT id FROM sessions WHERE updated <= ?", (now - self.ttl,))]
+        self._remove(conn, idle, "expired")
+        self._count("expired_idle", len(idle))
+        conn.execute("DELETE FROM session_tombstones WHERE removed < ?", (now - self.ttl,))
+        return len(idle)
+
+    def stats(self):
+        snapshot = super().stats()
+        entries, size = self._db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+        snapshot.update(entries=entries, bytes=size, backend="sqlite")
+        return snapshot
+
+    def _enforce_limits(self, conn):
+        entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+        if entries <= self.max_entries and total <= self.max_bytes:
+            return
+
+        evicted = []
+        for session_id, size in conn.execute("SELECT id, size FROM sessions ORDER BY updated").fetchall():
+            if entries <= self.max_entries and (total <= self.max_bytes or entries <= 1):
+                break
+            self._count("evicted_entries" if entries > self.max_entries else "evicted_bytes")
+            evicted.append(session_id)
+            entries -= 1
+            total -= size
+        self._remove(conn, evicted, "evicted")
+
+    def _remove(self, conn, session_ids, reason):
+        now = time.time()
+        for session_id in session_ids:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO session_tombstones (id, reason, removed) VALUES (?, ?, ?)",
+                (session_id, reason, now)
+            )
+
+
+def create_session_store():
+    """Build the backend selected by SESSION_BACKEND"""
+    if SESSION_BACKEND == "journal":
+        return JournaledSessionStore()
+    if SESSION_BACKEND == "sqlite":
+        return SqliteSessionStore()
+    if SESSION_BACKEND == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND}")
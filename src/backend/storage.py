@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Directory for state shared by all gunicorn workers on this host (or volume)
+DATA_DIR = os.getenv("AI4CS_DATA_DIR", os.path.join(tempfile.gettempdir(), "ai4cs"))
+
+_local = threading.local()
+
+
+def data_path(name):
+    """Return the absolute path of a file inside DATA_DIR, creating the directory if needed"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, name)
+
+
+def connect(path):
+    """Return this thread's SQLite connection to `path` (WAL mode, autocommit)"""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        connections[path] = conn
+    return conn
+
+
+def pid_alive(pid):
+    """True unless no process with `pid` exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def evict_lru(conn, table, ttl, max_bytes, now):
+    """Drop rows of a size-capped cache table older than `ttl`, then the least
+    recently used rows until their sizes add up to `max_bytes` at most.
+
+    `table` needs `size`, `created` and `accessed` columns.
+    """
+    conn.execute(f"DELETE FROM {table} WHERE created <= ?", (now - ttl,))
+    total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+    if total <= max_bytes:
+        return
+
+    for rowid, size in conn.execute(f"SELECT rowid, size FROM {table} ORDER BY accessed").fetchall():
+        conn.execute(f"DELETE FROM {table} WHERE rowid = ?", (rowid,))
+        total -= size
+        if total <= max_bytes:
+            break
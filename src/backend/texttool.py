@@ -1,60 +1,56 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from datetime import datetime
-import requests
-import os
-import io
+import logging
+import tempfile
+import shutil
 from dotenv import load_dotenv
-import fitz  # PyMuPDF for PDFs
-import docx  # python-docx for DOCX
+from generation import generation_response
+from idempotency import idempotent
+import tracing
+import metrics
+import uploads
+import extraction
+import extraction_cache
+import extraction_batch
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 # Create Blueprint for TextTool routes
 texttool_bp = Blueprint('texttool', __name__, url_prefix='/texttool')
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+@texttool_bp.route('/extract-text', methods=['POST'])
+def extract_text():
+    """Extract the text of an uploaded PDF, DOCX or TXT file.
+
+    Optional form or query values: `pages` ("1-3,7,10-", PDFs only),
+    `max_pages` and `max_chars` (stop early once reached). PDFs can be
+    streamed page by page as NDJSON with ?stream=1 or Accept: application/x-ndjson.
+    Responses carry the document's `contentHash`; sending that instead of
+    the file returns the cached extraction for the same options.
+    """
+    # Started before request.files so spooling the upload is measured too
+    watch = uploads.PeakRss()
+    try:
+        return _extract_text(watch)
+    finally:
+        # A streamed response stops the watch itself when the stream ends
+        if not watch.handed_off:
+            watch.stop()
 
-def call_gemini_api(prompt):
-    """Helper function to call Gemini API"""
+
+def _extract_text(watch):
     try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-        
-        payload = {
-            "contents": [
-                {
-                    "parts": [{"text": prompt}]
-                }
-            ],
-            "generationConfig": {
-                "maxOutputTokens": 2048,
-                "temperature": 0.7
-            }
-        }
-
-        response = requests.post(
-            url,
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=120
-        )
-
-        if response.status_code != 200:
-            return {
-                "error": "Gemini API failed",
-                "details": response.text
-            }, response.status_code
-
-        return response.json(), 200
-
-    except requests.exceptions.Timeout:
-        return {"error": "Request timed out"}, 504
-    except Exception as e:
-        return {"error": str(e)}, 500
+        options = extraction.parse_options(request.values)
+    except extraction.ExtractionOptionsError as e:
+        return jsonify({"error": str(e)}), 400
+    cache_options = dict(options, version=extraction.EXTRACTOR_VERSION)
 
-@texttool_bp.route('/extract-text', methods=['POST'])
-def extract_text():
     # Check if a file was uploaded
     if 'file' not in request.files:
+        if request.values.get("contentHash"):
+            return _extract_by_hash(request.values["contentHash"].strip().lower(), cache_options)
         return jsonify({"error": "No file part"}), 400
     
     file = request.files['file']
@@ -63,43 +59,140 @@ def extract_text():
         return jsonify({"error": "No selected file"}), 400
 
     filename = file.filename.lower()
-    content = ""
+    file_format = extraction.file_format(filename)
+    if file_format is None:
+        return jsonify({"error": "Unsupported file format"}), 400
 
     try:
-        # Read file into memory
-        file_bytes = file.read()
-
-        # 1. Handle PDF
-        if filename.endswith('.pdf'):
-            with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-                for page in doc:
-                    content += page.get_text()
-
-        # 2. Handle DOCX
-        elif filename.endswith('.docx'):
-            doc_file = io.BytesIO(file_bytes)
-            doc = docx.Document(doc_file)
-            full_text = [para.text for para in doc.paragraphs]
-            content = '\n'.join(full_text)
-
-        # 3. Handle TXT
-        elif filename.endswith('.txt'):
-            content = file_bytes.decode('utf-8')
-
-        else:
-            return jsonify({"error": "Unsupported file format"}), 400
-
-        print(f"Extracted {len(content)} characters from {filename}")
+        # A path when the upload was spooled to disk, else the bytes
+        source = uploads.upload_source(file)
+        digest = extraction_cache.content_hash(source)
+        upload = {"uploadBytes": uploads.source_size(source), "spooled": isinstance(source, str)}
+
+        if file_format == "pdf" and wants_ndjson():
+            # The stream (and the pool processes that reopen the file) outlive the
+            # request's spooled upload, so the response keeps its own link to it
+            directory = tempfile.mkdtemp(prefix="extract-stream-")
+            try:
+                source = uploads.keep_upload(source, directory, "upload.pdf")
+                lines = extraction.stream_pdf(source, summary={"contentHash": digest}, **options)
+            except Exception:
+                shutil.rmtree(directory, ignore_errors=True)
+                raise
+            watch.handed_off = True
+            response = Response(
+                stream_with_context(_watched_lines(lines, watch, file_format, filename, upload)),
+                mimetype="application/x-ndjson",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+            # Runs when the server closes the response, even if the body was never read
+            response.call_on_close(lambda: shutil.rmtree(directory, ignore_errors=True))
+            return response
+
+        result = extraction_cache.get(digest, cache_options)
+        cached = result is not None
+        if not cached:
+            result = extraction.extract_file(source, file_format, options)
+            extraction_cache.put(digest, cache_options, result)
+
+        content = result.pop("text")
+        _record_upload(watch, file_format, filename, upload, chars=len(content), cached=cached, **result)
         return jsonify({
             "status": "success",
             "extractedText": content,
-            "filename": file.filename
+            "filename": file.filename,
+            "contentHash": digest,
+            "cached": cached,
+            **result
         })
 
     except Exception as e:
         return jsonify({"error": f"Failed to process file: {str(e)}"}), 500
 
+
+def _extract_by_hash(digest, options):
+    result = extraction_cache.get(digest, options)
+    if result is None:
+        return jsonify({"error": "Unknown contentHash for these options, upload the file again"}), 404
+
+    content = result.pop("text")
+    log.info("extracted text", extra=tracing.fields(content_hash=digest, chars=len(content), cached=True))
+    return jsonify({
+        "status": "success",
+        "extractedText": content,
+        "contentHash": digest,
+        "cached": True,
+        **result
+    })
+
+
+def _watched_lines(lines, watch, file_format, filename, upload):
+    try:
+        yield from lines
+    finally:
+        _record_upload(watch, file_format, filename, upload, streamed=True)
+
+
+def _record_upload(watch, file_format, filename, upload, **details):
+    growth = watch.stop()
+    metrics.observe("ai4cs_upload_bytes", (file_format,), upload["uploadBytes"])
+    metrics.observe("ai4cs_upload_peak_rss_growth_bytes", (file_format,), growth)
+    log.info("extracted text", extra=tracing.fields(
+        filename=filename, peak_rss_growth_mb=round(growth / 1e6, 1), **upload, **details
+    ))
+
+
+@texttool_bp.route('/extract-batch', methods=['POST'])
+def extract_batch():
+    """Extract the text of several uploaded files (`files`, repeatable) and/or the members of uploaded ZIPs.
+
+    Takes the same options as /extract-text, applied to every file. The
+    response is NDJSON: one line per file as soon as it is done (in
+    completion order, with its `index` in the batch), errors isolated to
+    their own line, then a {"done": true, ...} summary.
+    """
+    try:
+        options = extraction.parse_options(request.values)
+    except extraction.ExtractionOptionsError as e:
+        return jsonify({"error": str(e)}), 400
+    cache_options = dict(options, version=extraction.EXTRACTOR_VERSION)
+
+    files = request.files.getlist("files") + request.files.getlist("file")
+    if not any(file.filename for file in files):
+        return jsonify({"error": "No files uploaded"}), 400
+
+    # Spooled uploads and ZIP members live here until the response is closed
+    directory = tempfile.mkdtemp(prefix="extract-batch-")
+    try:
+        batch = extraction_batch.expand_uploads(files, directory)
+    except extraction_batch.BatchError as e:
+        shutil.rmtree(directory, ignore_errors=True)
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        shutil.rmtree(directory, ignore_errors=True)
+        return jsonify({"error": f"Failed to process files: {str(e)}"}), 500
+    if not batch:
+        shutil.rmtree(directory, ignore_errors=True)
+        return jsonify({"error": "No files to extract"}), 400
+
+    response = Response(
+        stream_with_context(extraction_batch.iter_batch(batch, options, cache_options)),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Runs when the server closes the response, even if the body was never read
+    response.call_on_close(lambda: shutil.rmtree(directory, ignore_errors=True))
+    return response
+
+
+def wants_ndjson():
+    """True when the client asked for page-by-page output (?stream=1 or Accept: application/x-ndjson)"""
+    if request.args.get("stream") == "1":
+        return True
+    return "application/x-ndjson" in request.headers.get("Accept", "")
+
 @texttool_bp.route("/new-email", methods=["POST"])
+@idempotent
 def new_email():
     """Generate a new professional email"""
     try:
@@ -150,13 +243,13 @@ Detailed → 3-5 paragraphs
 
 Remove all introductory paragraph, end notes and any other non-relevant content."""
 
-        result, status_code = call_gemini_api(prompt)
-        return jsonify(result), status_code
+        return generation_response(prompt)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @texttool_bp.route("/reply-email", methods=["POST"])
+@idempotent
 def reply_email():
     """Generate a professional email reply"""
     try:
@@ -209,13 +302,13 @@ Format the reply professionally with proper spacing and structure.
 
 Remove all introductory paragraph, end notes and any other non-relevant content."""
 
-        result, status_code = call_gemini_api(prompt)
-        return jsonify(result), status_code
+        return generation_response(prompt)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @texttool_bp.route("/generate-blog", methods=["POST"])
+@idempotent
 def generate_blog():
     """Generate blog content based on type and data"""
     try:
@@ -226,8 +319,7 @@ def generate_blog():
         current_date = datetime.now().strftime("%d-%m-%Y")
         prompt = generate_blog_prompt(blog_type, blog_data, current_date)
         
-        result, status_code = call_gemini_api(prompt)
-        return jsonify(result), status_code
+        return generation_response(prompt, cache=True)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -504,23 +596,26 @@ Instructions:
 Format the blog professionally with proper structure and spacing. Remove all introductory paragraph, end notes and any other non-relevant content."""
 
 @texttool_bp.route("/generate-text-intelligence", methods=["POST"])
+@idempotent
 def generate_text_intelligence():
     """Generate content for Text Intelligence Hub operations"""
     try:
         data = request.get_json()
-        print("Text Intelligence Hub data:", data)
         
         # Validate required fields
         if 'operationType' not in data:
             return jsonify({"error": "Missing required field: operationType"}), 400
         
         operation_type = data['operationType']
+        log.info("text intelligence request", extra=tracing.fields(
+            operation=operation_type, content=tracing.payload(data.get('content'))
+        ))
+        tracing.mark("validate")
         
         # Generate prompt based on operation type
         prompt = generate_text_intelligence_prompt(operation_type, data)
         
-        result, status_code = call_gemini_api(prompt)
-        return jsonify(result), status_code
+        return generation_response(prompt)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -739,6 +834,7 @@ Format the output professionally with proper structure and spacing. Remove all i
 
 
 @texttool_bp.route("/generate-letter", methods=["POST"])
+@idempotent
 def generate_letter():
     """Generate letter content based on type and data"""
     try:
@@ -749,8 +845,7 @@ def generate_letter():
         current_date = datetime.now().strftime("%d-%m-%Y")
         prompt = generate_letter_prompt(letter_type, letter_data, current_date)
         
-        result, status_code = call_gemini_api(prompt)
-        return jsonify(result), status_code
+        return generation_response(prompt, cache=True)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -833,3 +928,5 @@ Instructions:
 
 Format the letter professionally with proper structure and spacing. Remove all introductory paragraph, end notes and any other non-relevant content."""
 
+# Registers the report routes (/internship-report, /project-report, ...) on texttool_bp
+import reports_code  # noqa: E402,F401
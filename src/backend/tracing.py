@@ -0,0 +1,250 @@
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import random
+import logging
+import threading
+import contextvars
+from functools import partial
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from dotenv import load_dotenv
+from flask import g, request, has_request_context
+from flask.json.provider import DefaultJSONProvider
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line, for log shipping) or "text" (for local development)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Records waiting for the writer thread beyond this are dropped rather than blocking a request
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+# Prompts, answers and model output are logged as their length; on this fraction
+# of requests a preview truncated to LOG_PAYLOAD_CHARS is added
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+LOG_PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", "200"))
+
+# Accepted from the client (or a proxy) when well formed, otherwise generated; always echoed back
+TRACE_HEADER = "X-Trace-Id"
+_VALID_TRACE_ID = re.compile(r"[A-Za-z0-9._-]{8,64}")
+
+# Set per request, and by background jobs for the request that queued them
+trace_id = contextvars.ContextVar("trace_id", default=None)
+_payload_sampled = contextvars.ContextVar("payload_sampled", default=False)
+
+log = logging.getLogger("ai4cs.request")
+
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def fields(**values):
+    """`extra=` argument attaching structured fields to a log record"""
+    return {"fields": values}
+
+
+def payload(text):
+    """Log field for user or model text: its length, plus a truncated preview on sampled requests"""
+    if text is None:
+        return None
+    field = {"chars": len(text)}
+    if _payload_sampled.get():
+        field["preview"] = text if len(text) <= LOG_PAYLOAD_CHARS else text[:LOG_PAYLOAD_CHARS] + "..."
+    return field
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = f"{self.formatTime(record)} {record.levelname} {record.name}"
+        if getattr(record, "trace_id", None):
+            line += f" [{record.trace_id}]"
+        line += f" {record.getMessage()}"
+        for key, value in getattr(record, "fields", {}).items():
+            line += f" {key}={json.dumps(value, ensure_ascii=False, default=str)}"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Hands records to a writer thread; the request thread never touches stdout"""
+
+    def prepare(self, record):
+        # Resolve everything that depends on the caller's context before the record changes threads
+        record.trace_id = trace_id.get()
+        if record.trace_id is None and has_request_context():
+            # Streamed responses run their generator outside the context the id was set in
+            record.trace_id = g.get("trace_id")
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        _ensure_listener(self)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass  # Dropping a log line is better than stalling the request
+
+
+def setup_logging():
+    """Route every logger through the queue handler (idempotent)"""
+    root = logging.getLogger()
+    if any(isinstance(handler, _NonBlockingQueueHandler) for handler in root.handlers):
+        return
+    root.addHandler(_NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_MAX)))
+    root.setLevel(LOG_LEVEL)
+
+
+def _ensure_listener(handler):
+    # Started lazily (and once per process) so it survives gunicorn forking workers
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        # A queue inherited from the parent may hold its records (and locks); start clean
+        handler.queue = queue.Queue(LOG_QUEUE_MAX)
+        output = logging.StreamHandler()
+        output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+        QueueListener(handler.queue, output).start()
+        _listener_pid = os.getpid()
+
+
+def mark(name):
+    """Close the current phase of the request: the time since the previous mark is booked to `name`"""
+    if not has_request_context() or "timings" not in g:
+        return
+    now = time.perf_counter()
+    g.timings[name] = g.timings.get(name, 0.0) + (now - g.last_mark)
+    g.last_mark = now
+
+
+@contextmanager
+def phase(name):
+    """Time a block as phase `name` of the current request (no-op outside a request)"""
+    if not has_request_context() or "timings" not in g:
+        yield
+        return
+    mark("app")
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, time.perf_counter() - started)
+
+
+def add_time(name, seconds):
+    """Book `seconds` measured elsewhere to phase `name` (e.g. reading a stream after the headers were sent)"""
+    if not has_request_context() or "timings" not in g:
+        return
+    g.timings[name] = g.timings.get(name, 0.0) + seconds
+    g.last_mark = time.perf_counter()
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Books the time spent building JSON responses to the `serialize` phase"""
+
+    def response(self, *args, **kwargs):
+        with phase("serialize"):
+            return super().response(*args, **kwargs)
+
+
+def server_timing():
+    """Server-Timing header value for the phases recorded so far"""
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in g.timings.items()]
+    entries.append(f"total;dur={(time.perf_counter() - g.started) * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def _start_request():
+    g.started = g.last_mark = time.perf_counter()
+    g.timings = {}
+    incoming = request.headers.get(TRACE_HEADER, "")
+    g.trace_id = incoming if _VALID_TRACE_ID.fullmatch(incoming) else uuid.uuid4().hex
+    trace_id.set(g.trace_id)
+    _payload_sampled.set(random.random() < LOG_PAYLOAD_SAMPLE_RATE)
+
+    if request.is_json:
+        # Parsed once here and cached for the view
+        request.get_json(silent=True)
+        mark("parse")
+
+
+def _finish_response(response):
+    if "timings" not in g:
+        return response
+    mark("app")
+    response.headers[TRACE_HEADER] = g.trace_id
+    response.headers["Server-Timing"] = server_timing()
+    g.status = response.status_code
+    if response.is_streamed:
+        # Teardown runs when the view returns and again when a stream_with_context
+        # body finishes, so streamed responses are logged once, when the server
+        # closes them and upstream time is complete
+        g.streamed = True
+        response.call_on_close(partial(_log_streamed, g._get_current_object(), request.method, request.path))
+    return response
+
+
+def _log_request(error=None):
+    if "timings" not in g:
+        return
+    if not g.get("streamed"):
+        _log_access(g, request.method, request.path, error)
+    elif error is not None and not isinstance(error, GeneratorExit):
+        # Raised by the stream itself (closing the generator is not an error)
+        g.stream_error = error
+    trace_id.set(None)
+
+
+def _log_streamed(request_globals, method, path):
+    token = trace_id.set(request_globals.trace_id)
+    try:
+        _log_access(request_globals, method, path, request_globals.get("stream_error"))
+    finally:
+        trace_id.reset(token)
+
+
+def _log_access(request_globals, method, path, error):
+    entry = fields(
+        method=method,
+        path=path,
+        status=request_globals.get("status", 500),
+        duration_ms=round((time.perf_counter() - request_globals.started) * 1000, 1),
+        phases_ms={name: round(seconds * 1000, 1) for name, seconds in request_globals.timings.items()}
+    )
+    if error is not None:
+        entry["fields"]["error"] = str(error)
+    log.info("request", extra=entry)
+
+
+def init_app(app):
+    setup_logging()
+    app.json = TimedJSONProvider(app)
+    app.before_request(_start_request)
+    app.after_request(_finish_response)
+    app.teardown_request(_log_request)
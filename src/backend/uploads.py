@@ -0,0 +1,114 @@
+import os
+import io
+import shutil
+import tempfile
+import threading
+from dotenv import load_dotenv
+from flask import Request
+
+load_dotenv()
+
+# Requests larger than this are refused with a 413 before the body is read
+# (or as soon as a chunked body passes it)
+MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", str(50 * 1024 * 1024)))
+# Uploads above this are written to a temporary file instead of memory
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+UPLOAD_RSS_SAMPLE_SECONDS = float(os.getenv("UPLOAD_RSS_SAMPLE_SECONDS", "0.02"))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class SpoolingRequest(Request):
+    """Request whose file uploads go to a named temporary file above UPLOAD_SPOOL_BYTES.
+
+    A named file (unlike werkzeug's default SpooledTemporaryFile) lets the
+    parsers open the upload by path and read it on demand.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        size = content_length or total_content_length
+        if size is not None and size <= UPLOAD_SPOOL_BYTES:
+            return io.BytesIO()
+        return tempfile.NamedTemporaryFile(mode="rb+", prefix="upload-")
+
+
+def upload_source(file):
+    """Where parsers should read an upload from: the spooled file's path, or the bytes if it stayed in memory"""
+    stream = file.stream
+    name = getattr(stream, "name", None)
+    if isinstance(name, str) and os.path.exists(name):
+        stream.flush()
+        return name
+    return file.read()
+
+
+def keep_upload(source, directory, name):
+    """Link a spooled upload into `directory` so it outlives the request.
+
+    The request deletes its temporary files as soon as the view returns, but
+    a streamed response reads the upload afterwards. Bytes are returned as they are.
+    """
+    if not isinstance(source, str):
+        return source
+    path = os.path.join(directory, name)
+    try:
+        os.link(source, path)
+    except OSError:
+        # Another filesystem (or no hard links): copy instead
+        shutil.copyfile(source, path)
+    return path
+
+
+def source_size(source):
+    return os.path.getsize(source) if isinstance(source, str) else len(source)
+
+
+def rss_bytes():
+    """Resident set size of this process (0 where /proc is not available)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+class PeakRss:
+    """Samples RSS on a background thread until stop(); `growth` is the peak above the start.
+
+    Measures this process by default (other requests served by it at the same
+    time are counted too); `sample` can read another figure in bytes, such as
+    a whole process tree. Usable as a context manager.
+    """
+
+    def __init__(self, sample=rss_bytes, interval=None):
+        self.sample = sample
+        self.interval = UPLOAD_RSS_SAMPLE_SECONDS if interval is None else interval
+        self.start = self.peak = sample()
+        # Set when a streamed response takes over stopping the watch
+        self.handed_off = False
+        self._stop = threading.Event()
+        self._thread = None
+        if self.start:
+            self._thread = threading.Thread(target=self._sample, name="peak-rss", daemon=True)
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.sample())
+
+    def stop(self):
+        if self._thread is not None and not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, self.sample())
+        return self.growth
+
+    @property
+    def growth(self):
+        return max(0, self.peak - self.start)
@@ -7,6 +7,7 @@ import { FaPaperPlane } from "react-icons/fa";
 
 const BusinessStrategist = () => {
   const [sessionId, setSessionId] = useState(null);
+  const [questionCount, setQuestionCount] = useState(null);
   const [messages, setMessages] = useState([]);
   const [userInput, setUserInput] = useState("");
   const [loading, setLoading] = useState(false);
@@ -64,6 +65,7 @@ const BusinessStrategist = () => {
 
       const data = await response.json();
       setSessionId(data.session_id);
+      setQuestionCount(data.question_count);
       setFunctionName(data.function_name);
       setConsultationStarted(true);
       
@@ -110,14 +112,17 @@ const BusinessStrategist = () => {
           type: "next",
           session_id: sessionId,
           answer: userInput,
+          question_count: questionCount,
         }),
       });
 
       if (!response.ok) {
-        throw new Error("Failed to get next question");
+        const errorData = await response.json().catch(() => ({}));
+        throw new Error(errorData.error || "Failed to get next question");
       }
 
       const data = await response.json();
+      setQuestionCount(data.question_count);
       
       const aiMessage = {
         type: "ai",
@@ -128,7 +133,7 @@ const BusinessStrategist = () => {
       setMessages((prev) => [...prev, aiMessage]);
     } catch (error) {
       console.error("Error sending message:", error);
-      alert("Failed to send message. Please try again.");
+      alert(error.message || "Failed to send message. Please try again.");
     } finally {
       setLoading(false);
     }